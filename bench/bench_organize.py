@@ -0,0 +1,307 @@
+"""
+Stage benchmark for organizing synthetic directory trees.
+
+Builds seeded random trees in a tmpfs (/dev/shm when available), with
+extensions and keywords taken from rules.json, and times each stage of an
+organize run separately: scan, classify (all families and each family on
+its own), plan, move and tree rendering. Every case runs in a fresh
+interpreter so that its peak RSS is its own.
+
+Syscalls are counted by wrapping the functions of the os module (and open)
+for the duration of each stage. Calls made inside C code, such as the stat
+behind DirEntry.stat(), are not seen.
+
+Usage:
+    python bench/bench_organize.py [--files 1000,10000] [--depth 0,3]
+        [--collisions 0.1] [--sizes mixed] [--seed 0] [--output results.json]
+        [--compare baseline.json]
+"""
+import argparse
+import builtins
+import json
+import os
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from organizer import RULE_PRECEDENCE, RuleSet, apply_plan, plan_directory, walk_tree, write_tree  # noqa: E402
+
+# Funciones de os que se cuentan como llamadas al sistema
+COUNTED_CALLS = ("stat", "lstat", "scandir", "listdir", "open", "close", "rename", "replace",
+                 "link", "unlink", "mkdir", "rmdir", "pread", "utime", "fsync", "statvfs")
+
+SIZE_DISTRIBUTIONS = ("empty", "small", "mixed")
+
+# Extensiones que ninguna regla conoce, para los archivos sin clasificar
+UNKNOWN_EXTENSIONS = ("", ".bin", ".dat", ".xyz")
+
+class SyscallCounter:
+    """
+    Count calls to the os functions in COUNTED_CALLS (and builtins.open).
+
+    Use as a context manager: the functions are wrapped on entry and restored
+    on exit, and the counts stay in self.counts.
+    """
+
+    def __init__(self):
+        self.counts = Counter()
+        self._lock = threading.Lock()
+        self._saved = []
+
+    def _wrap(self, module, name, key):
+        original = getattr(module, name)
+        counts, lock = self.counts, self._lock
+
+        def counted(*args, **kwargs):
+            with lock:
+                counts[key] += 1
+            return original(*args, **kwargs)
+
+        self._saved.append((module, name, original))
+        setattr(module, name, counted)
+
+    def __enter__(self):
+        for name in COUNTED_CALLS:
+            if hasattr(os, name):
+                self._wrap(os, name, name)
+        self._wrap(builtins, "open", "open")
+        return self
+
+    def __exit__(self, *exc):
+        for module, name, original in reversed(self._saved):
+            setattr(module, name, original)
+        self._saved.clear()
+        return False
+
+def file_size(rng, sizes):
+    """Draw a file size, in bytes, from one of SIZE_DISTRIBUTIONS."""
+    if sizes == "empty":
+        return 0
+    if sizes == "small" or rng.random() < 0.9:
+        return min(int(rng.lognormvariate(8, 1.5)), 16 << 20)
+    return min(int(rng.lognormvariate(16, 2)), 256 << 20)
+
+def make_tree(root, files, depth, rules, seed=0, collisions=0.1, sizes="mixed", unknown=0.1):
+    """
+    Fill root with a seeded random tree of files.
+
+    Files are sparse (only their size is set), so large sizes cost nothing
+    on a tmpfs; mtimes are spread over the last two years.
+
+    Args:
+        root (str): Empty directory to fill.
+        files (int): Number of files to create.
+        depth (int): Levels of subdirectories below root.
+        rules (dict): Raw rules; their extensions and keywords name the files.
+        seed (int, optional): Random seed. Defaults to 0.
+        collisions (float, optional): Share of files reusing the name of an
+            earlier file in another directory. Defaults to 0.1.
+        sizes (str, optional): One of SIZE_DISTRIBUTIONS. Defaults to "mixed".
+        unknown (float, optional): Share of files with an extension no rule
+            knows. Defaults to 0.1.
+
+    Returns:
+        int: Number of directories created, root included.
+    """
+    rng = random.Random(seed)
+    extensions = sorted(rules.get("endwith", {}))
+    keywords = sorted(rules.get("contains", {}))
+
+    directories = [(root, 0)]
+    for i in range(max(0, files // 100) if depth else 0):
+        parent, level = rng.choice([d for d in directories if d[1] < depth] or directories)
+        path = os.path.join(parent, f"dir{i:05d}")
+        os.mkdir(path)
+        directories.append((path, level + 1))
+
+    now = time.time()
+    used = []
+    taken = set()
+    for i in range(files):
+        directory = rng.choice(directories)[0]
+        if used and rng.random() < collisions:
+            name = rng.choice(used)
+        else:
+            stem = f"{rng.choice(keywords)}_{i:07d}" if keywords and rng.random() < 0.2 else f"file{i:07d}"
+            extension = (rng.choice(UNKNOWN_EXTENSIONS) if not extensions or rng.random() < unknown
+                         else rng.choice(extensions))
+            name = stem + extension
+            used.append(name)
+        if (directory, name) in taken:
+            name = f"{i:07d}_{name}"
+        taken.add((directory, name))
+        path = os.path.join(directory, name)
+        with open(path, "wb") as f:
+            f.truncate(file_size(rng, sizes))
+        mtime = now - rng.uniform(0, 2 * 365 * 86400)
+        os.utime(path, (mtime, mtime))
+    return len(directories)
+
+def peak_rss_kb():
+    """Return the peak resident set size of this process, in KiB."""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+def measure(stages, name, function):
+    """Run function, recording its time, syscalls and the peak RSS after it."""
+    with SyscallCounter() as counter:
+        start = time.perf_counter()
+        result = function()
+        elapsed = time.perf_counter() - start
+    stages[name] = {"seconds": round(elapsed, 6), "syscalls": dict(sorted(counter.counts.items())),
+                    "peak_rss_kb": peak_rss_kb()}
+    return result
+
+def run_case(case, base):
+    """
+    Build the tree of one case and time every stage on it.
+
+    Args:
+        case (dict): files, depth, collisions, sizes, seed and jobs.
+        base (str): Directory to build the tree in.
+
+    Returns:
+        dict: The case, the size of the tree and the measures of each stage.
+    """
+    with open(os.path.join(ROOT, "rules.json"), encoding="utf-8") as f:
+        raw = json.load(f)
+    ruleset = RuleSet(raw)
+    root = tempfile.mkdtemp(prefix="bench-", dir=base)
+    try:
+        start = time.perf_counter()
+        directories = make_tree(root, case["files"], case["depth"], raw, case["seed"],
+                                case["collisions"], case["sizes"])
+        generate_seconds = time.perf_counter() - start
+        stages = {}
+
+        entries = measure(stages, "scan", lambda: [
+            entry for _, files in walk_tree(root, None) for entry in files])
+        now = time.time()
+        measure(stages, "classify", lambda: [ruleset.classify(entry, RULE_PRECEDENCE, now)
+                                             for entry in entries])
+        for family in RULE_PRECEDENCE:
+            measure(stages, f"classify:{family}", lambda: [ruleset.classify(entry, (family,), now)
+                                                           for entry in entries])
+        entries = None
+        plan = measure(stages, "plan", lambda: plan_directory(root, ruleset, depth=None))
+        results = measure(stages, "move", lambda: apply_plan(plan, jobs=case["jobs"]))
+
+        def render():
+            with open(os.devnull, "w", encoding="utf-8") as f:
+                write_tree(f, root)
+
+        measure(stages, "tree", render)
+        return {
+            "case": case,
+            "directories": directories,
+            "planned_moves": len(plan),
+            "failed_moves": sum(1 for result in results if result.error),
+            "generate_seconds": round(generate_seconds, 6),
+            "stages": stages,
+            "peak_rss_kb": peak_rss_kb(),
+        }
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+def default_base():
+    """Return /dev/shm if it is usable, else the system temporary directory."""
+    if os.path.isdir("/dev/shm") and os.access("/dev/shm", os.W_OK):
+        return "/dev/shm"
+    return tempfile.gettempdir()
+
+def current_commit():
+    """Return the short hash of HEAD, or None outside a git checkout."""
+    try:
+        result = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                                capture_output=True, text=True, check=True)
+        return result.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def case_key(case):
+    """Return the parameters that identify a case across result files."""
+    return tuple(case[k] for k in ("files", "depth", "collisions", "sizes", "seed", "jobs"))
+
+def compare(results, baseline_file):
+    """Print the time of each stage relative to a previous results file."""
+    with open(baseline_file, encoding="utf-8") as f:
+        baseline = {case_key(r["case"]): r for r in json.load(f)["cases"]}
+    for result in results["cases"]:
+        old = baseline.get(case_key(result["case"]))
+        if old is None:
+            continue
+        print(f"{describe(result['case'])} vs {baseline_file}:")
+        for stage, measures in result["stages"].items():
+            before = old["stages"].get(stage, {}).get("seconds")
+            if before:
+                print(f"  {stage:<22} {before:9.4f}s -> {measures['seconds']:9.4f}s "
+                      f"({measures['seconds'] / before:5.2f}x)")
+
+def describe(case):
+    """Return a one-line description of a case."""
+    return (f"{case['files']} archivos, profundidad {case['depth']}, "
+            f"colisiones {case['collisions']}, tamaños {case['sizes']}")
+
+def int_list(text):
+    """Parse a comma-separated list of integers."""
+    return [int(value) for value in text.split(",")]
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark por etapas sobre árboles sintéticos')
+    parser.add_argument('--files', type=int_list, default=[1000, 10000], metavar='N[,N...]',
+                        help='Número de archivos de cada caso (por defecto: 1000,10000)')
+    parser.add_argument('--depth', type=int_list, default=[0, 3], metavar='D[,D...]',
+                        help='Niveles de subdirectorios de cada caso (por defecto: 0,3)')
+    parser.add_argument('--collisions', type=float, default=0.1, metavar='RATIO',
+                        help='Proporción de nombres repetidos (por defecto: 0.1)')
+    parser.add_argument('--sizes', choices=SIZE_DISTRIBUTIONS, default="mixed",
+                        help='Distribución de tamaños (por defecto: mixed)')
+    parser.add_argument('--seed', type=int, default=0, help='Semilla aleatoria (por defecto: 0)')
+    parser.add_argument('--jobs', type=int, default=1, metavar='N',
+                        help='Hilos para mover los archivos (por defecto: 1)')
+    parser.add_argument('--tmp', default=None, metavar='DIR',
+                        help='Directorio donde crear los árboles (por defecto: /dev/shm)')
+    parser.add_argument('--output', '-o', metavar='FILE', help='Guardar los resultados en JSON')
+    parser.add_argument('--compare', metavar='FILE', help='Comparar con resultados anteriores')
+    parser.add_argument('--case', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    base = args.tmp or default_base()
+    if args.case:
+        json.dump(run_case(json.loads(args.case), base), sys.stdout)
+        return
+
+    results = {"commit": current_commit(), "python": sys.version.split()[0],
+               "platform": sys.platform, "tmp": base, "cases": []}
+    for files in args.files:
+        for depth in args.depth:
+            case = {"files": files, "depth": depth, "collisions": args.collisions,
+                    "sizes": args.sizes, "seed": args.seed, "jobs": args.jobs}
+            # Cada caso en un intérprete nuevo, para que su pico de memoria sea solo suyo
+            output = subprocess.run([sys.executable, os.path.abspath(__file__), "--case",
+                                     json.dumps(case), "--tmp", base],
+                                    capture_output=True, text=True, check=True).stdout
+            result = json.loads(output)
+            results["cases"].append(result)
+            print(f"{describe(case)}: pico {result['peak_rss_kb'] / 1024:.1f} MiB")
+            for stage, measures in result["stages"].items():
+                print(f"  {stage:<22} {measures['seconds']:9.4f}s  "
+                      f"{sum(measures['syscalls'].values()):>9} llamadas")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"Resultados guardados en {args.output}")
+    if args.compare:
+        compare(results, args.compare)
+
+if __name__ == "__main__":
+    main()
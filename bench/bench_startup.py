@@ -0,0 +1,77 @@
+"""
+Startup benchmark for the command line.
+
+Runs `python main.py -l` several times in a fresh interpreter and checks
+that no Qt module is imported and that the fastest run stays under a time
+budget. Exits with status 1 if either check fails.
+
+Usage:
+    python bench/bench_startup.py [--runs N] [--budget SECONDS]
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Presupuesto por defecto para `main.py -l`, en segundos
+DEFAULT_BUDGET = 0.5
+
+def qt_imports(root=ROOT):
+    """
+    Return the Qt modules imported by `python main.py -l`.
+
+    Uses -X importtime, which reports every module imported by the run.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "main.py", "-l"],
+        cwd=root, capture_output=True, text=True, check=True,
+    )
+    modules = []
+    for line in result.stderr.splitlines():
+        if line.startswith("import time:"):
+            module = line.rsplit("|", 1)[-1].strip()
+            if module.startswith(("PyQt5", "PyQt6", "PySide")):
+                modules.append(module)
+    return modules
+
+def time_startup(runs, root=ROOT):
+    """Return the wall time, in seconds, of each `python main.py -l` run."""
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "main.py", "-l"], cwd=root,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark de arranque de main.py -l')
+    parser.add_argument('--runs', type=int, default=5, metavar='N',
+                        help='Número de ejecuciones (por defecto: 5)')
+    parser.add_argument('--budget', type=float, default=DEFAULT_BUDGET, metavar='SECONDS',
+                        help=f'Tiempo máximo de la ejecución más rápida (por defecto: {DEFAULT_BUDGET})')
+    args = parser.parse_args()
+
+    failed = False
+    modules = qt_imports()
+    if modules:
+        print(f"FALLO: main.py -l importa Qt: {', '.join(modules)}")
+        failed = True
+    else:
+        print("OK: main.py -l no importa Qt")
+
+    timings = time_startup(args.runs)
+    best = min(timings)
+    print(f"main.py -l: mejor {best * 1000:.1f} ms, mediana "
+          f"{sorted(timings)[len(timings) // 2] * 1000:.1f} ms en {args.runs} ejecuciones")
+    if best > args.budget:
+        print(f"FALLO: supera el presupuesto de {args.budget * 1000:.0f} ms")
+        failed = True
+
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
@@ -2,15 +2,22 @@ import sys
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, 
                            QHBoxLayout, QLabel, QLineEdit, QPushButton, 
                            QTableWidget, QTableWidgetItem, QTabWidget, 
-                           QMessageBox, QStyle, QHeaderView, QCheckBox, QTextEdit,
-                           QFileDialog)
-from PyQt5.QtCore import Qt, QSize
+                           QMessageBox, QStyle, QHeaderView, QCheckBox,
+                           QFileDialog, QProgressBar, QPlainTextEdit, QTreeView)
+from PyQt5.QtCore import (Qt, QSize, QThread, pyqtSignal, QObject, QRunnable, QThreadPool,
+                          QAbstractItemModel, QModelIndex, QTimer)
 from PyQt5.QtGui import QIcon, QColor, QPalette
 import json
+import logging
 import os
-from main import order_files
+import time
+from organizer import (plan_directory, iter_apply_plan, save_tree, MoveJournal, RuleSet,
+                       save_rules as write_rules)
 import re
 
+# Espera tras la última edición antes de escribir rules.json, en milisegundos
+SAVE_DELAY = 300
+
 class ModernButton(QPushButton):
     def __init__(self, text, icon_name=None):
         super().__init__(text)
@@ -83,11 +90,307 @@ class ModernTable(QTableWidget):
         self.setSelectionMode(QTableWidget.SingleSelection)
         self.verticalHeader().setVisible(False)
 
+# Listados ya leídos, por ruta: (mtime_ns del directorio, [(nombre, es_directorio)])
+_listing_cache = {}
+
+def list_directory(path):
+    """
+    List a directory for the tree preview: folders first, then files, by name.
+
+    Listings are cached and reused while the directory's mtime is unchanged.
+
+    Args:
+        path (str): Directory to list.
+
+    Returns:
+        list: (name, is_dir) pairs.
+    """
+    mtime = os.stat(path).st_mtime_ns
+    cached = _listing_cache.get(path)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+    with os.scandir(path) as it:
+        entries = [(entry.name, entry.is_dir()) for entry in it]
+    entries.sort(key=lambda item: (not item[1], item[0]))
+    _listing_cache[path] = (mtime, entries)
+    return entries
+
+class _ListingSignals(QObject):
+    # Ruta, generación del modelo, entradas (o None) y mensaje de error
+    listed = pyqtSignal(str, int, object, str)
+
+class _ListingTask(QRunnable):
+    def __init__(self, path, generation, signals):
+        super().__init__()
+        self.path = path
+        self.generation = generation
+        self.signals = signals
+
+    def run(self):
+        try:
+            self.signals.listed.emit(self.path, self.generation, list_directory(self.path), "")
+        except OSError as e:
+            self.signals.listed.emit(self.path, self.generation, None, str(e))
+
+class _TreeNode:
+    __slots__ = ("name", "path", "is_dir", "depth", "parent", "row", "entries", "children",
+                 "loading", "error")
+
+    def __init__(self, name, path, is_dir, depth, parent=None, row=0):
+        self.name = name
+        self.path = path
+        self.is_dir = is_dir
+        self.depth = depth
+        self.parent = parent
+        self.row = row
+        self.entries = None
+        self.children = []
+        self.loading = False
+        self.error = None
+
+class LazyTreeModel(QAbstractItemModel):
+    """
+    Directory tree model that lists a folder only when its node is expanded.
+
+    Listings run on a QThreadPool (see list_directory) and rows are added
+    FETCH_BATCH at a time as the view scrolls, so opening a huge tree costs
+    one listing and a screenful of rows. Only the rows the view shows are
+    ever rendered.
+
+    Attributes:
+        max_depth (int): Deepest level whose contents are listed (the root
+            is level 0, as in iter_tree), None for no limit; set with set_root.
+    """
+
+    FETCH_BATCH = 1000
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._signals = _ListingSignals()
+        self._signals.listed.connect(self._on_listed)
+        self._pool = QThreadPool(self)
+        self._generation = 0
+        self._pending = {}
+        self._root = None
+        self.max_depth = None
+
+    def set_root(self, directory, max_depth=None):
+        """Show a new directory; listings still in flight are discarded."""
+        self.beginResetModel()
+        self._generation += 1
+        self._pending.clear()
+        self.max_depth = max_depth
+        directory = os.path.abspath(directory)
+        self._root = _TreeNode(os.path.basename(directory) or directory, directory, True, 0)
+        self.endResetModel()
+
+    def _node(self, index):
+        return index.internalPointer() if index.isValid() else self._root
+
+    def index(self, row, column, parent=QModelIndex()):
+        node = self._node(parent)
+        if node is None or not 0 <= row < len(node.children) or column != 0:
+            return QModelIndex()
+        return self.createIndex(row, column, node.children[row])
+
+    def parent(self, index):
+        if not index.isValid():
+            return QModelIndex()
+        parent = index.internalPointer().parent
+        if parent is None or parent is self._root:
+            return QModelIndex()
+        return self.createIndex(parent.row, 0, parent)
+
+    def rowCount(self, parent=QModelIndex()):
+        node = self._node(parent)
+        return len(node.children) if node is not None else 0
+
+    def columnCount(self, parent=QModelIndex()):
+        return 1
+
+    def hasChildren(self, parent=QModelIndex()):
+        node = self._node(parent)
+        if node is None or not node.is_dir or node.error:
+            return False
+        if self.max_depth is not None and node.depth > self.max_depth:
+            return False
+        return node.entries is None or bool(node.entries)
+
+    def canFetchMore(self, parent):
+        if not self.hasChildren(parent):
+            return False
+        node = self._node(parent)
+        if node.entries is None:
+            return not node.loading
+        return len(node.children) < len(node.entries)
+
+    def fetchMore(self, parent):
+        node = self._node(parent)
+        if node.entries is None:
+            node.loading = True
+            self._pending[node.path] = node
+            self._pool.start(_ListingTask(node.path, self._generation, self._signals))
+            return
+        self._add_rows(parent, node)
+
+    def _add_rows(self, parent, node):
+        start = len(node.children)
+        batch = node.entries[start:start + self.FETCH_BATCH]
+        if not batch:
+            return
+        self.beginInsertRows(parent, start, start + len(batch) - 1)
+        node.children.extend(
+            _TreeNode(name, os.path.join(node.path, name), is_dir, node.depth + 1, node, start + offset)
+            for offset, (name, is_dir) in enumerate(batch)
+        )
+        self.endInsertRows()
+
+    def _on_listed(self, path, generation, entries, error):
+        if generation != self._generation:
+            return
+        node = self._pending.pop(path, None)
+        if node is None:
+            return
+        node.loading = False
+        parent = QModelIndex() if node is self._root else self.createIndex(node.row, 0, node)
+        if entries is None:
+            node.error = error
+            node.entries = []
+            if parent.isValid():
+                self.dataChanged.emit(parent, parent)
+            return
+        node.entries = entries
+        self._add_rows(parent, node)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        node = index.internalPointer()
+        if role == Qt.DisplayRole:
+            if node.error:
+                return f"{node.name}  [Error: {node.error}]"
+            return node.name
+        if role == Qt.DecorationRole:
+            icon = QStyle.SP_DirIcon if node.is_dir else QStyle.SP_FileIcon
+            return QApplication.style().standardIcon(icon)
+        return None
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if orientation == Qt.Horizontal and role == Qt.DisplayRole:
+            return self._root.path if self._root is not None else ""
+        return None
+
+class OrganizeWorker(QThread):
+    """
+    Plan and carry out an organize run off the GUI thread.
+
+    Progress is reported after every batch of moves. cancel() stops the run
+    between batches; the files already moved stay where they are and are
+    recorded in the run's journal, so the run can still be undone.
+    """
+
+    # Archivos escaneados, movimientos totales, movidos, errores, movimientos/s, ETA en segundos
+    progress = pyqtSignal(int, int, int, int, float, float)
+    message = pyqtSignal(str)
+    # Movidos, errores, cancelado
+    done = pyqtSignal(int, int, bool)
+
+    BATCH_SIZE = 200
+
+    def __init__(self, directory, ruleset, families, parent=None):
+        super().__init__(parent)
+        self.directory = directory
+        self.ruleset = ruleset
+        self.families = families
+        self._cancelled = False
+
+    def cancel(self):
+        self._cancelled = True
+
+    def run(self):
+        moved = failed = 0
+        try:
+            plan = plan_directory(self.directory, self.ruleset, self.families)
+            # Los movimientos de aplanado y clasificación de un mismo archivo cuentan una vez
+            destinations = {move.destination for move in plan}
+            scanned = plan.in_place + plan.unmatched + plan.skipped + sum(1 for move in plan if move.source not in destinations)
+            self.message.emit(f"{scanned} archivos escaneados, {len(plan)} movimientos planeados")
+            self.progress.emit(scanned, len(plan), 0, 0, 0.0, 0.0)
+
+            journal = MoveJournal(self.directory) if plan else None
+            start = time.monotonic()
+            batches = iter_apply_plan(plan, journal=journal, batch_size=self.BATCH_SIZE)
+            try:
+                for batch in batches:
+                    for result in batch:
+                        if result.error:
+                            failed += 1
+                            self.message.emit(f"Error al mover {result.source}: {result.error}")
+                        else:
+                            moved += 1
+                    rate = (moved + failed) / max(time.monotonic() - start, 1e-6)
+                    eta = (len(plan) - moved - failed) / rate if rate else 0.0
+                    self.progress.emit(scanned, len(plan), moved, failed, rate, eta)
+                    if self._cancelled:
+                        break
+            finally:
+                batches.close()
+                if journal is not None:
+                    journal.close()
+                    self.message.emit(f"Ejecución registrada como {journal.run_id}")
+
+            if not self._cancelled and self.ruleset.get("generate_tree", False):
+                save_tree(self.directory, os.path.join(self.directory, "directory_tree.txt"),
+                          max_depth=self.ruleset.get("tree_max_depth", None))
+        except Exception as e:
+            self.message.emit(f"Error al organizar archivos: {e}")
+            failed += 1
+        self.done.emit(moved, failed, self._cancelled)
+
+class PlanPreviewWorker(QThread):
+    """
+    Plan an organize run off the GUI thread, for the plan preview.
+
+    Only the first MAX_LINES moves are formatted: the preview widget would
+    be unusable with millions of lines, and the total is still reported.
+    """
+
+    # Texto de la vista previa y número total de movimientos
+    ready = pyqtSignal(str, int)
+    failed = pyqtSignal(str)
+
+    MAX_LINES = 10000
+
+    def __init__(self, directory, ruleset, families, parent=None):
+        super().__init__(parent)
+        self.directory = directory
+        self.ruleset = ruleset
+        self.families = families
+
+    def run(self):
+        try:
+            plan = plan_directory(self.directory, self.ruleset, self.families)
+        except Exception as e:
+            self.failed.emit(str(e))
+            return
+        lines = [f"{move.source} -> {move.destination} [{move.rule}]"
+                 for move in plan[:self.MAX_LINES]]
+        if len(plan) > self.MAX_LINES:
+            lines.append(f"... y {len(plan) - self.MAX_LINES} movimientos más")
+        lines.append(f"{len(plan)} movimientos planeados")
+        self.ready.emit("\n".join(lines), len(plan))
+
 class OrganizerGUI(QMainWindow):
     def __init__(self):
         super().__init__()
         self.setWindowTitle("Organizador de Archivos")
         self.setMinimumSize(1000, 700)
+        self.organize_worker = None
+        self.preview_worker = None
+        self.save_timer = QTimer(self)
+        self.save_timer.setSingleShot(True)
+        self.save_timer.setInterval(SAVE_DELAY)
+        self.save_timer.timeout.connect(self.flush_rules)
         self.setup_ui()
         self.load_rules()
         self.setStyleSheet("""
@@ -272,12 +575,14 @@ class OrganizerGUI(QMainWindow):
         self.max_depth_entry.setPlaceholderText("Vacío para sin límite")
         depth_layout.addWidget(self.max_depth_entry)
         
-        # Vista previa del árbol
+        # Vista previa del árbol: los directorios se listan al expandirlos
         layout.addWidget(QLabel("Vista previa:"))
-        self.tree_preview = QTextEdit()
-        self.tree_preview.setReadOnly(True)
+        self.tree_model = LazyTreeModel(self)
+        self.tree_preview = QTreeView()
+        self.tree_preview.setModel(self.tree_model)
+        self.tree_preview.setUniformRowHeights(True)
         self.tree_preview.setStyleSheet("""
-            QTextEdit {
+            QTreeView {
                 font-family: monospace;
                 border: 1px solid #E5E7EB;
                 border-radius: 4px;
@@ -293,10 +598,14 @@ class OrganizerGUI(QMainWindow):
     def update_tree_preview(self):
         try:
             max_depth = int(self.max_depth_entry.text()) if self.max_depth_entry.text() else None
-            tree = generate_tree(".", max_depth=max_depth)
-            self.tree_preview.setText(tree)
-        except Exception as e:
-            QMessageBox.warning(self, "Error", f"Error al generar vista previa: {str(e)}")
+        except ValueError:
+            QMessageBox.warning(self, "Error", "La profundidad máxima debe ser un número entero")
+            return
+        directory = self.organize_directory_input.text().strip() or "."
+        self.tree_model.set_root(directory, max_depth=max_depth)
+        # La raíz se lista en segundo plano; la vista muestra las filas al llegar
+        if self.tree_model.canFetchMore(QModelIndex()):
+            self.tree_model.fetchMore(QModelIndex())
 
     def add_size_rule(self):
         size_range = self.size_range_entry.text().strip()
@@ -439,10 +748,21 @@ class OrganizerGUI(QMainWindow):
             self.rules["tree_max_depth"] = max_depth
         except:
             self.rules["tree_max_depth"] = None
-            
-        with open("rules.json", "w", encoding='utf-8') as f:
-            json.dump(self.rules, f, indent=4, ensure_ascii=False)
+
+        # Las ediciones seguidas se agrupan en una sola escritura
         self.update_tables()
+        self.save_timer.start()
+
+    def flush_rules(self):
+        """
+        Write pending rule edits to rules.json and recompile the rules.
+        """
+        self.save_timer.stop()
+        try:
+            self.ruleset = write_rules(self.rules, "rules.json")
+        except (OSError, ValueError) as e:
+            logging.error(f"No se pudieron guardar las reglas: {e}")
+            QMessageBox.warning(self, "Error", f"No se pudieron guardar las reglas: {e}")
 
     def load_rules(self):
         try:
@@ -450,6 +770,7 @@ class OrganizerGUI(QMainWindow):
                 self.rules = json.load(f)
         except FileNotFoundError:
             self.rules = {"endwith": {}, "contains": {}}
+        self.ruleset = RuleSet(self.rules)
         self.update_tables()
 
     def setup_extensions_tab(self):
@@ -561,12 +882,100 @@ class OrganizerGUI(QMainWindow):
         del self.rules["contains"][content]
         self.save_rules()
 
+    def selected_families(self):
+        """
+        Rule families enabled by the strategy checkboxes of the organize tab.
+
+        Regex rules have no checkbox and are always applied.
+        """
+        return tuple(family for family, check in self.strategy_checks if check.isChecked()) + ("regex",)
+
     def organize_files(self):
-        try:
-            order_files(".")
+        """
+        Start an organize run of the selected directory on an OrganizeWorker.
+        """
+        if self.organize_worker is not None and self.organize_worker.isRunning():
+            return
+        if self.save_timer.isActive():
+            self.flush_rules()
+        directory = self.organize_directory_input.text().strip() or "."
+        if not os.path.isdir(directory):
+            QMessageBox.warning(self, "Error", f"{directory} no es un directorio válido")
+            return
+
+        self.organize_log.clear()
+        self.organize_progress.setValue(0)
+        self.tab_widget.setCurrentWidget(self.organize_tab)
+        self.organize_worker = OrganizeWorker(directory, self.ruleset, self.selected_families(), self)
+        self.organize_worker.progress.connect(self.on_organize_progress)
+        self.organize_worker.message.connect(self.organize_log.appendPlainText)
+        self.organize_worker.done.connect(self.on_organize_done)
+        self.set_organizing(True)
+        self.organize_worker.start()
+
+    def cancel_organize(self):
+        if self.organize_worker is not None:
+            self.organize_worker.cancel()
+            self.cancel_btn.setEnabled(False)
+
+    def set_organizing(self, running):
+        self.organize_btn.setEnabled(not running)
+        self.organize_tab_btn.setEnabled(not running)
+        self.cancel_btn.setEnabled(running)
+
+    def on_organize_progress(self, scanned, total, moved, failed, rate, eta):
+        self.organize_progress.setMaximum(max(total, 1))
+        self.organize_progress.setValue(moved + failed if total else 1)
+        self.organize_status.setText(
+            f"Escaneados: {scanned}  Movidos: {moved}  Errores: {failed}  "
+            f"{rate:.0f} archivos/s  Restante: {eta:.0f} s"
+        )
+
+    def on_organize_done(self, moved, failed, cancelled):
+        self.set_organizing(False)
+        if cancelled:
+            self.organize_log.appendPlainText(f"Cancelado: {moved} movidos, {failed} errores")
+        elif failed:
+            QMessageBox.warning(self, "Error", f"{moved} archivos movidos, {failed} errores")
+        else:
             QMessageBox.information(self, "Éxito", "Archivos organizados correctamente")
-        except Exception as e:
-            QMessageBox.critical(self, "Error", f"Error al organizar archivos: {str(e)}")
+
+    def closeEvent(self, event):
+        if self.save_timer.isActive():
+            self.flush_rules()
+        if self.organize_worker is not None and self.organize_worker.isRunning():
+            self.organize_worker.cancel()
+            self.organize_worker.wait()
+        if self.preview_worker is not None and self.preview_worker.isRunning():
+            self.preview_worker.wait()
+        super().closeEvent(event)
+
+    def preview_plan(self):
+        """
+        Show the moves an organize run would make, without moving anything.
+
+        The plan is computed on a PlanPreviewWorker, so large directories do
+        not freeze the window.
+        """
+        if self.preview_worker is not None and self.preview_worker.isRunning():
+            return
+        if self.save_timer.isActive():
+            self.flush_rules()
+        directory = self.organize_directory_input.text().strip() or "."
+        self.plan_preview.setPlainText("Calculando el plan...")
+        self.preview_plan_btn.setEnabled(False)
+        self.preview_worker = PlanPreviewWorker(directory, self.ruleset, self.selected_families(), self)
+        self.preview_worker.ready.connect(self.on_preview_ready)
+        self.preview_worker.failed.connect(self.on_preview_failed)
+        self.preview_worker.finished.connect(lambda: self.preview_plan_btn.setEnabled(True))
+        self.preview_worker.start()
+
+    def on_preview_ready(self, text, total):
+        self.plan_preview.setPlainText(text)
+
+    def on_preview_failed(self, error):
+        self.plan_preview.clear()
+        QMessageBox.warning(self, "Error", f"Error al generar el plan: {error}")
 
     def select_directory(self):
         """
@@ -605,6 +1014,7 @@ class OrganizerGUI(QMainWindow):
         Create a tab for file organization with directory selection.
         """
         organize_tab = QWidget()
+        self.organize_tab = organize_tab
         organize_layout = QVBoxLayout()
 
         # Directory selection section
@@ -640,14 +1050,61 @@ class OrganizerGUI(QMainWindow):
         # Date-based organization
         date_check = QCheckBox("Organizar por fecha")
         options_layout.addWidget(date_check)
+
+        self.strategy_checks = [
+            ("endwith", extension_check),
+            ("contains", content_check),
+            ("size_ranges", size_check),
+            ("date_ranges", date_check),
+        ]
         
         options_group.setLayout(options_layout)
         organize_layout.addWidget(options_group)
 
+        # Vista previa del plan de movimientos
+        self.plan_preview = QPlainTextEdit()
+        self.plan_preview.setReadOnly(True)
+        self.plan_preview.setStyleSheet("""
+            QPlainTextEdit {
+                font-family: monospace;
+                border: 1px solid #E5E7EB;
+                border-radius: 4px;
+                padding: 8px;
+            }
+        """)
+        organize_layout.addWidget(self.plan_preview)
+
+        self.preview_plan_btn = ModernButton("Vista Previa del Plan", "SP_FileDialogContentsView")
+        self.preview_plan_btn.clicked.connect(self.preview_plan)
+        organize_layout.addWidget(self.preview_plan_btn)
+
         # Organize button
-        organize_btn = ModernButton("Organizar Archivos", "SP_DialogApplyButton")
-        organize_btn.clicked.connect(self.organize_files)
-        organize_layout.addWidget(organize_btn)
+        self.organize_tab_btn = ModernButton("Organizar Archivos", "SP_DialogApplyButton")
+        self.organize_tab_btn.clicked.connect(self.organize_files)
+        organize_layout.addWidget(self.organize_tab_btn)
+
+        # Progreso y registro de la ejecución en curso
+        self.organize_progress = QProgressBar()
+        organize_layout.addWidget(self.organize_progress)
+        self.organize_status = QLabel("")
+        organize_layout.addWidget(self.organize_status)
+
+        self.organize_log = QPlainTextEdit()
+        self.organize_log.setReadOnly(True)
+        self.organize_log.setStyleSheet("""
+            QPlainTextEdit {
+                font-family: monospace;
+                border: 1px solid #E5E7EB;
+                border-radius: 4px;
+                padding: 8px;
+            }
+        """)
+        organize_layout.addWidget(self.organize_log)
+
+        self.cancel_btn = ModernButton("Cancelar", "SP_DialogCancelButton")
+        self.cancel_btn.setEnabled(False)
+        self.cancel_btn.clicked.connect(self.cancel_organize)
+        organize_layout.addWidget(self.cancel_btn)
 
         # Add stretch to push everything to the top
         organize_layout.addStretch(1)
@@ -656,6 +1113,7 @@ class OrganizerGUI(QMainWindow):
         self.tab_widget.addTab(organize_tab, "Organizar")
 
 def main():
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
     app = QApplication(sys.argv)
     app.setStyle('Fusion')
     window = OrganizerGUI()
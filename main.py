@@ -1,219 +1,99 @@
-from hashlib import sha1
 import os
-import shutil
 import json
-import subprocess
 import argparse
-import datetime
-from pathlib import Path
-import re
 import logging
 import sys
-from PyQt5.QtWidgets import QApplication
+import time
 
-# Set up logging
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+from organizer import (api, RULE_PRECEDENCE, TREE_FORMATS, CONFLICT_POLICIES, DEDUPE_MODES,
+                       STATS_FORMATS, MetadataIndex, MoveJournal, RunStats, apply_plan,
+                       incomplete_runs, load_plan, measure, plan_files, plan_root,
+                       recover_runs, save_plan, save_rules, save_tree, undo_run)
+from organizer import load_rules as _load_rules
+from organizer.watch import InotifyWatcher, PollingWatcher
 
-def load_rules(rules_file="rules.json"):
-    """Load rules from a JSON file with error handling."""
-    try:
-        with open(rules_file, 'r', encoding='utf-8') as f:
-            rules = json.load(f)
-        
-        # Validate rules structure
-        if not all(key in rules for key in ["endwith", "contains"]):
-            raise ValueError("El archivo de configuración no tiene el formato correcto")
-        
-        return rules
-    except (FileNotFoundError, json.JSONDecodeError, ValueError) as e:
-        logging.error(f"Error al cargar reglas: {e}")
-        # Provide a default configuration if loading fails
-        return {
-            "endwith": {},
-            "contains": {},
-            "size_ranges": {},
-            "date_ranges": {}
-        }
+# Archivo de reglas de la línea de comandos, relativo al directorio actual
+RULES_FILE = "rules.json"
 
-def order_extensions(directory, rules):
-    rules = rules["endwith"]
-    for filename in os.listdir(directory):
-        file_path = os.path.join(directory, filename)
-
-        # Saltar si es un directorio
-        if os.path.isdir(file_path):
-            continue
-
-        # Obtener la extensión del archivo
-        _, extension = os.path.splitext(filename)
-
-        # Verificar si tenemos una regla para esta extensión
-        if extension in rules:
-            # Crear el directorio de destino si no existe
-            target_dir = os.path.join(directory, rules[extension])
-            if not os.path.exists(target_dir):
-                os.makedirs(target_dir)
-
-            # Mover el archivo
-            target_path = os.path.join(target_dir, filename)
-            try:
-                shutil.move(file_path, target_path)
-            except Exception as e:
-                logging.error(f"Error al mover archivo {filename}: {e}")
-
-def order_by_in(directory, content, output_dir):
-    for filename in os.listdir(directory):
-        file_path = os.path.join(directory, filename)
-
-        # Saltar si es un directorio
-        if os.path.isdir(file_path):
-            continue
-        if content in filename:
-            if not os.path.exists(output_dir):
-                os.makedirs(output_dir)
-            try:
-                subprocess.Popen(["mv", filename, output_dir])
-            except Exception as e:
-                logging.error(f"Error al mover archivo {filename}: {e}")
-            continue
-
-def generate_tree(directory, prefix="", is_last=True, max_depth=None, current_depth=0):
+def load_rules(rules_file=RULES_FILE):
     """
-    Generate a directory tree representation.
-    
+    Load and compile rules from a JSON file with error handling.
+
     Args:
-        directory (str): Path to the directory to generate tree for
-        prefix (str, optional): Prefix for tree formatting. Defaults to "".
-        is_last (bool, optional): Whether this is the last item in its level. Defaults to True.
-        max_depth (int, optional): Maximum depth to traverse. Defaults to None.
-        current_depth (int, optional): Current depth of traversal. Defaults to 0.
-    
+        rules_file (str, optional): Path to the rules file. Defaults to "rules.json".
+
     Returns:
-        str: Formatted directory tree as a string
+        RuleSet: The compiled rules, or an empty RuleSet if the file cannot be loaded.
     """
-    # Check max depth
-    if max_depth is not None and current_depth > max_depth:
-        return ""
-    
-    # Get the base name of the directory
-    base_name = os.path.basename(directory)
-    
-    # Start the output with the current directory
-    output = prefix + ("└── " if is_last else "├── ") + base_name + "\n"
-    
-    # If it's a directory, list its contents
-    if os.path.isdir(directory):
-        try:
-            # Get sorted list of items in the directory
-            items = sorted([os.path.join(directory, item) for item in os.listdir(directory)])
-            
-            # Separate folders and files
-            folders = [item for item in items if os.path.isdir(item)]
-            files = [item for item in items if os.path.isfile(item)]
-            
-            # Recursively add folders
-            for i, folder in enumerate(folders):
-                is_last_folder = (i == len(folders) - 1) and not files
-                new_prefix = prefix + ("    " if is_last else "│   ")
-                output += generate_tree(
-                    folder, 
-                    new_prefix, 
-                    is_last_item=is_last_folder, 
-                    max_depth=max_depth, 
-                    current_depth=current_depth + 1
-                )
-            
-            # Add files
-            for i, file in enumerate(files):
-                is_last_file = i == len(files) - 1
-                output += prefix + ("└── " if is_last_file and not folders else "├── ") + os.path.basename(file) + "\n"
-        
-        except PermissionError:
-            # Handle directories with no read permissions
-            output += prefix + "│   [Acceso denegado]\n"
-        except Exception as e:
-            # Handle other potential errors
-            output += prefix + f"│   [Error: {str(e)}]\n"
-    
-    return output
+    return _load_rules(rules_file)
 
-def save_tree(directory, output_file, max_depth=None):
+def organize_directory(directory, rules, families=RULE_PRECEDENCE, jobs=1, conflict="rename"):
     """
-    Save the directory tree to a file.
-    
+    Classify and move the files of a directory in a single pass.
+
+    The directory is scanned once, every file gets at most one destination
+    (see RULE_PRECEDENCE) and only then are the moves carried out.
+
     Args:
-        directory (str): Path to the directory to generate tree for
-        output_file (str): Path to the output file
-        max_depth (int, optional): Maximum depth to traverse. Defaults to None.
+        directory (str): Directory to organize.
+        rules (RuleSet or dict): Rules as loaded by load_rules.
+        families (tuple, optional): Rule families to apply. Defaults to all.
+        jobs (int, optional): Worker threads for the moves. Defaults to 1.
+        conflict (str, optional): One of CONFLICT_POLICIES. Defaults to "rename".
+
+    Returns:
+        list: MoveResult for every file that matched a rule.
     """
-    try:
-        tree = generate_tree(directory, max_depth=max_depth)
-        
-        with open(output_file, 'w', encoding='utf-8') as f:
-            f.write(f"Árbol de Directorios generado el: {datetime.datetime.now()}\n")
-            f.write("=" * 50 + "\n")
-            f.write(tree)
-        
-        logging.info(f"Árbol de directorios guardado en: {output_file}")
-    except Exception as e:
-        logging.error(f"Error al guardar el árbol de directorios: {e}")
+    return api.apply(api.plan(directory, rules, families, flatten=False, conflict=conflict),
+                     jobs=jobs)
+
+def order_extensions(directory, rules):
+    organize_directory(directory, rules, ("endwith",))
+
+def order_by_in(directory, content, output_dir):
+    organize_directory(directory, {"endwith": {}, "contains": {content: output_dir}}, ("contains",))
 
 def order_by_size(directory, rules):
-    size_rules = rules.get("size_ranges", {})
-    for filename in os.listdir(directory):
-        file_path = os.path.join(directory, filename)
-        if os.path.isfile(file_path):
-            size = os.path.getsize(file_path)
-            for size_range, folder in size_rules.items():
-                min_size, max_size = map(lambda x: int(x) * 1024 * 1024, size_range.split('-'))
-                if min_size <= size <= max_size:
-                    target_dir = os.path.join(directory, folder)
-                    if not os.path.exists(target_dir):
-                        os.makedirs(target_dir)
-                    try:
-                        shutil.move(file_path, os.path.join(target_dir, filename))
-                    except Exception as e:
-                        logging.error(f"Error al mover archivo {filename}: {e}")
-                    break
+    organize_directory(directory, rules, ("size_ranges",))
 
 def order_by_date(directory, rules):
-    date_rules = rules.get("date_ranges", {})
-    for filename in os.listdir(directory):
-        file_path = os.path.join(directory, filename)
-        if os.path.isfile(file_path):
-            mtime = os.path.getmtime(file_path)
-            file_date = datetime.datetime.fromtimestamp(mtime)
-            for date_range, folder in date_rules.items():
-                days = int(date_range.split('-')[0])
-                cutoff_date = datetime.datetime.now() - datetime.timedelta(days=days)
-                if file_date >= cutoff_date:
-                    target_dir = os.path.join(directory, folder)
-                    if not os.path.exists(target_dir):
-                        os.makedirs(target_dir)
-                    try:
-                        shutil.move(file_path, os.path.join(target_dir, filename))
-                    except Exception as e:
-                        logging.error(f"Error al mover archivo {filename}: {e}")
-                    break
+    organize_directory(directory, rules, ("date_ranges",))
 
 def order_by_regex(directory, rules):
-    regex_rules = rules.get("regex", {})
-    for filename in os.listdir(directory):
-        file_path = os.path.join(directory, filename)
-        if os.path.isfile(file_path):
-            for pattern, folder in regex_rules.items():
-                if re.search(pattern, filename):
-                    target_dir = os.path.join(directory, folder)
-                    if not os.path.exists(target_dir):
-                        os.makedirs(target_dir)
-                    try:
-                        shutil.move(file_path, os.path.join(target_dir, filename))
-                    except Exception as e:
-                        logging.error(f"Error al mover archivo {filename}: {e}")
-                    break
-
-def order_files(directory, rules_file="rules.json"):
-    """Organize files based on rules from a JSON file."""
+    organize_directory(directory, rules, ("regex",))
+
+def order_files(directory, rules_file=RULES_FILE, jobs=1, use_index=False, incremental=False,
+                depth=1, exclude=(), scan_workers=1, dedupe=None, sniff=False, conflict="rename",
+                journal=True, stats=None):
+    """
+    Organize files based on rules from a JSON file.
+
+    Args:
+        directory (str): Directory to organize.
+        rules_file (str, optional): Path to the rules file. Defaults to "rules.json".
+        jobs (int, optional): Worker threads for the moves. Defaults to 1.
+        use_index (bool, optional): Keep a MetadataIndex in the directory and
+            only process new or changed files. Defaults to False.
+        incremental (bool, optional): Leave files that are already in their
+            rule destination where they are. Defaults to False.
+        depth (int, optional): Levels of subdirectories to organize; None for
+            the whole tree. Defaults to 1.
+        exclude (tuple, optional): Glob patterns of files and directories to
+            leave alone. Defaults to ().
+        scan_workers (int, optional): Threads listing directories in parallel
+            during the scan. Defaults to 1.
+        dedupe (str, optional): What to do with duplicate files, one of
+            DEDUPE_MODES (see dedupe_plan); None to move them like any
+            other file. Defaults to None.
+        sniff (bool, optional): Classify the files no rule matched by their
+            content. Defaults to False.
+        conflict (str, optional): What to do when a destination name is
+            taken, one of CONFLICT_POLICIES. Defaults to "rename".
+        journal (bool, optional): Record the run in a MoveJournal so it can
+            be undone. Defaults to True.
+        stats (RunStats, optional): Collect counters and timers of the
+            plan, dedupe, move and tree stages. Defaults to None.
+    """
     rules = load_rules(rules_file)
     
     # Validate directory
@@ -221,37 +101,130 @@ def order_files(directory, rules_file="rules.json"):
         logging.error(f"Error: {directory} no es un directorio válido")
         return
 
-    # Primero mover todos los archivos al directorio principal
-    for subdirectory in os.listdir(directory):
-        subdirectory_path = os.path.join(directory, subdirectory)
-        if os.path.isdir(subdirectory_path):
-            for item in os.listdir(subdirectory_path):
-                item_path = os.path.join(subdirectory_path, item)
-                if os.path.isfile(item_path):
-                    try:
-                        shutil.move(item_path, directory)
-                    except Exception as e:
-                        logging.error(f"Error al mover archivo {item}: {e}")
-
-    # Apply different organization strategies
+    for run_id in incomplete_runs(directory):
+        logging.warning(f"La ejecución {run_id} quedó incompleta; use --recover finish "
+                        f"o --recover rollback para completarla o revertirla")
+
+    # Aplanar los subdirectorios y clasificar en una sola pasada (ver RULE_PRECEDENCE)
+    index = MetadataIndex(directory) if use_index else None
     try:
-        order_extensions(directory, rules)
-        for content in rules.get("contains", {}).keys():
-            order_by_in(directory, content, rules["contains"][content])
-        order_by_size(directory, rules)
-        order_by_date(directory, rules)
-        order_by_regex(directory, rules)
-        
+        plan = api.plan(directory, rules, incremental=incremental, depth=depth, exclude=exclude,
+                        workers=scan_workers, sniff=sniff, conflict=conflict, dedupe=dedupe,
+                        index=index, stats=stats)
+        if dedupe:
+            logging.info(f"{plan.duplicates} archivos duplicados encontrados")
+        if plan.in_place:
+            logging.info(f"{plan.in_place} archivos ya estaban en su lugar")
+        if plan.unmatched:
+            logging.info(f"{plan.unmatched} archivos sin regla que los clasifique")
+        if plan.skipped:
+            logging.info(f"{plan.skipped} archivos omitidos por conflicto de nombres")
+        if plan and journal:
+            with MoveJournal(directory) as run_journal:
+                api.apply(plan, jobs=jobs, journal=run_journal, stats=stats)
+            logging.info(f"Ejecución registrada como {run_journal.run_id} (deshacer con --undo)")
+        else:
+            api.apply(plan, jobs=jobs, stats=stats)
+        if index is not None:
+            index.commit()
+
         logging.info(f"Archivos organizados exitosamente en: {directory}")
     except Exception as e:
         logging.error(f"Error durante la organización de archivos: {e}")
         import traceback
         traceback.print_exc()
+    finally:
+        if index is not None:
+            index.close()
 
     # Generar árbol si está configurado
     if rules.get("generate_tree", False):
-        save_tree(directory, os.path.join(directory, "directory_tree.txt"), 
-                 max_depth=rules.get("tree_max_depth", None))
+        with measure(stats, "tree"):
+            save_tree(directory, os.path.join(directory, "directory_tree.txt"),
+                      max_depth=rules.get("tree_max_depth", None), workers=scan_workers)
+
+# Máximo de archivos acumulados antes de procesar un lote aunque sigan llegando eventos
+WATCH_BATCH_SIZE = 1000
+
+def watch_directory(directory, rules_file=RULES_FILE, debounce=0.5, poll_interval=1.0,
+                    use_polling=False, jobs=1, conflict="rename"):
+    """
+    Keep organizing a directory as files arrive, until interrupted.
+
+    Files already present are organized first. After that, new files are
+    collected from inotify (or PollingWatcher when inotify is unavailable)
+    and, once no event has arrived for debounce seconds, the burst is
+    classified and moved as one batch with the same rules as order_files.
+    Every pass that moves files is recorded in its own MoveJournal, so it
+    can be undone with --undo or recovered after a crash.
+
+    Args:
+        directory (str): Directory to watch.
+        rules_file (str, optional): Path to the rules file. Defaults to "rules.json".
+        debounce (float, optional): Quiet seconds before a batch is processed. Defaults to 0.5.
+        poll_interval (float, optional): Seconds between polls in polling mode. Defaults to 1.0.
+        use_polling (bool, optional): Skip inotify and always poll. Defaults to False.
+        jobs (int, optional): Worker threads for the moves. Defaults to 1.
+        conflict (str, optional): One of CONFLICT_POLICIES. Defaults to "rename".
+
+    The rules file is checked before every batch and recompiled only when
+    it has changed, so edits take effect without restarting.
+    """
+    rules = load_rules(rules_file)
+
+    def reload_rules():
+        nonlocal rules
+        current = load_rules(rules_file)
+        if current is not rules:
+            logging.info(f"Reglas recargadas desde {rules_file}")
+            rules = current
+        return rules
+
+    def organize(plan):
+        if not plan:
+            return []
+        with MoveJournal(directory) as journal:
+            results = apply_plan(plan, jobs=jobs, journal=journal)
+        logging.info(f"Lote registrado como {journal.run_id} (deshacer con --undo)")
+        return results
+
+    watcher = None
+    if not use_polling:
+        try:
+            watcher = InotifyWatcher(directory)
+        except (OSError, AttributeError) as e:
+            logging.warning(f"inotify no disponible ({e}), se usará sondeo")
+    if watcher is None:
+        watcher = PollingWatcher(directory, poll_interval)
+
+    organize(api.plan(directory, rules, flatten=False, conflict=conflict))
+    logging.info(f"Vigilando el directorio: {directory}")
+
+    pending = {}
+    deadline = None
+    try:
+        while True:
+            timeout = poll_interval if deadline is None else max(0, deadline - time.monotonic())
+            names = watcher.poll(timeout)
+            if names is None:
+                logging.warning("Cola de eventos desbordada, reorganizando el directorio completo")
+                organize(api.plan(directory, reload_rules(), flatten=False, conflict=conflict))
+                pending.clear()
+                deadline = None
+                continue
+            if names:
+                pending.update(dict.fromkeys(names))
+                deadline = time.monotonic() + debounce
+            if pending and (len(pending) >= WATCH_BATCH_SIZE or time.monotonic() >= deadline):
+                results = organize(plan_files(directory, list(pending), reload_rules(), conflict=conflict))
+                if results:
+                    logging.info(f"{len(results)} archivos organizados")
+                pending.clear()
+                deadline = None
+    except KeyboardInterrupt:
+        logging.info("Vigilancia detenida")
+    finally:
+        watcher.close()
 
 def export_config(rules, output_file):
     """Export current configuration to a JSON file."""
@@ -273,8 +246,7 @@ def import_config(input_file):
             raise ValueError("El archivo de configuración no tiene el formato correcto")
         
         # Update the main rules file
-        with open("rules.json", "w", encoding='utf-8') as f:
-            json.dump(new_rules, f, indent=4, ensure_ascii=False)
+        save_rules(new_rules, RULES_FILE)
         
         logging.info(f"Configuración importada desde: {input_file}")
     except (FileNotFoundError, json.JSONDecodeError, ValueError) as e:
@@ -291,10 +263,13 @@ def select_directory(method=None):
     Returns:
         str: Path to the selected directory or None if no directory selected.
     """
-    # Try GUI method first
+    # Try GUI method first, only if there is a display to open it on
+    has_display = sys.platform in ("win32", "darwin") or bool(
+        os.environ.get("DISPLAY") or os.environ.get("WAYLAND_DISPLAY"))
     try:
+        if not has_display:
+            raise ImportError("sin pantalla")
         from PyQt5.QtWidgets import QFileDialog, QApplication
-        import sys
         
         # Ensure QApplication exists
         app = QApplication.instance() or QApplication(sys.argv)
@@ -355,6 +330,9 @@ def select_directory(method=None):
             else:
                 print("❌ La ruta no es un directorio válido. Intenta de nuevo.")
         
+        except EOFError:
+            # Entrada cerrada: no hay a quién preguntar
+            return None
         except Exception as e:
             print(f"Error: {e}")
             print("Intenta de nuevo.")
@@ -374,37 +352,64 @@ def main():
     parser.add_argument('--list-rules', '-l', action='store_true',
                        help='Listar todas las reglas actuales')
     parser.add_argument('--tree', '-t', nargs='?', const='tree.txt', metavar='OUTPUT_FILE',
-                       help='Generar árbol de directorios (por defecto: tree.txt)')
+                       help='Generar árbol de directorios (por defecto: tree.txt, "-" para la salida estándar)')
+    parser.add_argument('--format', choices=TREE_FORMATS, default='text',
+                       help='Formato del árbol: text, json o ndjson (por defecto: text)')
+    parser.add_argument('--max-depth', type=int, metavar='N',
+                       help='Profundidad máxima del árbol generado (no limita los totales)')
     parser.add_argument('--export-config', '-x', nargs=1, metavar='OUTPUT_FILE',
                        help='Exportar configuración actual a un archivo JSON')
     parser.add_argument('--import-config', '-i', nargs=1, metavar='INPUT_FILE',
                        help='Importar configuración desde un archivo JSON')
+    parser.add_argument('--dry-run', '-n', action='store_true',
+                       help='Mostrar los movimientos planeados sin mover nada')
+    parser.add_argument('--plan', '-p', metavar='OUTPUT_FILE',
+                       help='Guardar el plan de movimientos en un archivo JSONL sin mover nada')
+    parser.add_argument('--apply-plan', '-a', metavar='INPUT_FILE',
+                       help='Ejecutar un plan de movimientos guardado con --plan')
+    parser.add_argument('--index', action='store_true',
+                       help='Usar un índice persistente para procesar solo archivos nuevos o modificados')
+    parser.add_argument('--incremental', action='store_true',
+                       help='Dejar en su lugar los archivos que ya están en su carpeta de destino')
+    parser.add_argument('--recursive', '-r', action='store_true',
+                       help='Organizar también los archivos de todos los subdirectorios')
+    parser.add_argument('--depth', type=int, default=1, metavar='N',
+                       help='Niveles de subdirectorios a organizar (por defecto: 1)')
+    parser.add_argument('--exclude', action='append', default=[], metavar='GLOB',
+                       help='Patrón de archivos o carpetas a ignorar (se puede repetir)')
+    parser.add_argument('--scan-workers', type=int, default=1, metavar='N',
+                       help='Listar directorios en paralelo con N hilos (útil en NFS/SMB)')
+    parser.add_argument('--watch', '-w', action='store_true',
+                       help='Vigilar el directorio y organizar los archivos a medida que llegan')
+    parser.add_argument('--poll', action='store_true',
+                       help='En modo vigilancia, sondear el directorio en lugar de usar inotify')
+    parser.add_argument('--jobs', '-j', type=int, default=1, metavar='N',
+                       help='Mover archivos en paralelo con N hilos (por defecto: 1)')
+    parser.add_argument('--on-conflict', choices=CONFLICT_POLICIES, default='rename',
+                       help='Si el nombre ya existe en el destino: omitir (skip), sobrescribir (overwrite), '
+                            'renombrar a "nombre (n).ext" (rename, por defecto) o conservar el más reciente (newer)')
+    parser.add_argument('--undo', metavar='RUN_ID',
+                       help='Deshacer una ejecución registrada en el diario (.organizer/journal/)')
+    parser.add_argument('--recover', choices=('finish', 'rollback'),
+                       help='Completar (finish) o revertir (rollback) las ejecuciones interrumpidas')
+    parser.add_argument('--sniff', action='store_true',
+                       help='Reconocer por su contenido los archivos sin extensión o con una extensión desconocida')
+    parser.add_argument('--dedupe', choices=DEDUPE_MODES,
+                       help='Detectar archivos duplicados y omitirlos (skip), enlazarlos (link) '
+                            'o moverlos a la carpeta duplicates (move)')
+    parser.add_argument('--stats', choices=STATS_FORMATS,
+                       help='Mostrar al terminar contadores y tiempos por etapa y por familia de reglas')
+    parser.add_argument('--profile', metavar='DIR',
+                       help='Perfilar cada etapa con cProfile y guardar DIR/<etapa>.prof')
     
     args = parser.parse_args()
-    
-    # Directory selection logic
-    directory = None
-    
-    if args.directory:
-        # Use provided directory
-        directory = os.path.abspath(os.path.expanduser(args.directory))
-        if not os.path.isdir(directory):
-            logging.error(f"El directorio {directory} no es válido")
-            return
-    
-    if args.select or not directory:
-        # Open directory selection
-        directory = select_directory()
-        
-        if not directory:
-            logging.error("No se seleccionó ningún directorio")
-            return
-    
-    # Default to current directory if no directory specified
-    directory = directory or os.getcwd()
-    
+    depth = None if args.recursive else args.depth
+
+    # Set up logging (the organizer package only logs through its own loggers)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
     if args.gui:
-        import sys
+        # Qt solo se importa al abrir la interfaz gráfica
         from PyQt5.QtWidgets import QApplication
         from gui import OrganizerGUI
         app = QApplication(sys.argv)
@@ -416,28 +421,24 @@ def main():
         ext, folder = args.add_extension
         if not ext.startswith('.'):
             ext = '.' + ext
-        with open("rules.json", "r+") as f:
+        with open(RULES_FILE, "r") as f:
             rules = json.load(f)
-            rules["endwith"][ext] = folder
-            f.seek(0)
-            json.dump(rules, f, indent=4)
-            f.truncate()
+        rules["endwith"][ext] = folder
+        save_rules(rules, RULES_FILE)
         logging.info(f"Regla agregada: archivos {ext} -> carpeta {folder}")
         return
 
     if args.add_content:
         content, folder = args.add_content
-        with open("rules.json", "r+") as f:
+        with open(RULES_FILE, "r") as f:
             rules = json.load(f)
-            rules["contains"][content] = folder
-            f.seek(0)
-            json.dump(rules, f, indent=4)
-            f.truncate()
+        rules["contains"][content] = folder
+        save_rules(rules, RULES_FILE)
         logging.info(f"Regla agregada: archivos que contienen '{content}' -> carpeta {folder}")
         return
 
     if args.list_rules:
-        with open("rules.json", "r") as f:
+        with open(RULES_FILE, "r") as f:
             rules = json.load(f)
             logging.info("\nReglas por extensión:")
             for ext, folder in rules["endwith"].items():
@@ -447,13 +448,8 @@ def main():
                 logging.info(f"  '{content}' -> {folder}")
         return
 
-    if args.tree:
-        save_tree(args.directory, args.tree)
-        logging.info(f"Árbol de directorios guardado en: {args.tree}")
-        return
-
     if args.export_config:
-        with open("rules.json", "r") as f:
+        with open(RULES_FILE, "r") as f:
             rules = json.load(f)
         export_config(rules, args.export_config[0])
         return
@@ -462,10 +458,88 @@ def main():
         import_config(args.import_config[0])
         return
 
+    if args.apply_plan:
+        # El plan ya tiene rutas absolutas: el diario va al directorio que organiza
+        plan = load_plan(args.apply_plan)
+        directory = (os.path.abspath(os.path.expanduser(args.directory)) if args.directory
+                     else plan_root(plan))
+        if directory is None:
+            logging.info("El plan está vacío")
+            return
+        with MoveJournal(directory) as journal:
+            results = apply_plan(plan, jobs=args.jobs, journal=journal)
+        failed = sum(1 for result in results if result.error)
+        logging.info(f"Plan aplicado en {directory}: {len(results) - failed} movidos, {failed} errores")
+        return
+
+    # Directory selection logic (the rule commands above don't need one)
+    directory = None
+    
+    if args.directory:
+        # Use provided directory
+        directory = os.path.abspath(os.path.expanduser(args.directory))
+        if not os.path.isdir(directory):
+            logging.error(f"El directorio {directory} no es válido")
+            return
+    
+    if not directory and not args.select and not sys.stdin.isatty():
+        # Sin terminal (cron, tuberías) no se organiza nada que no se haya indicado
+        logging.error("Indique el directorio con -d (o -s para seleccionarlo)")
+        sys.exit(1)
+
+    if args.select or not directory:
+        # Open directory selection
+        directory = select_directory()
+        
+        if not directory:
+            logging.error("No se seleccionó ningún directorio")
+            sys.exit(1)
+    
+    if args.tree:
+        save_tree(directory, args.tree, max_depth=args.max_depth, output_format=args.format,
+                  workers=args.scan_workers)
+        return
+
+    if args.dry_run or args.plan:
+        plan = api.plan(directory, load_rules(), incremental=args.incremental, depth=depth,
+                        exclude=args.exclude, workers=args.scan_workers, sniff=args.sniff,
+                        conflict=args.on_conflict, dedupe=args.dedupe)
+        if args.plan:
+            save_plan(plan, args.plan)
+        else:
+            for move in plan:
+                logging.info(f"{move.source} -> {move.destination} [{move.rule}]")
+            logging.info(f"{len(plan)} movimientos planeados, {plan.in_place} archivos ya en su lugar, "
+                         f"{plan.unmatched} sin regla, {plan.skipped} omitidos por conflicto, "
+                         f"{plan.duplicates} duplicados")
+        return
+
+    if args.undo:
+        results = undo_run(directory, args.undo)
+        failed = sum(1 for result in results if result.error)
+        logging.info(f"Ejecución {args.undo} deshecha: {len(results) - failed} restaurados, {failed} errores")
+        return
+
+    if args.recover:
+        runs = recover_runs(directory, args.recover, jobs=args.jobs)
+        logging.info(f"{len(runs)} ejecuciones interrumpidas recuperadas")
+        return
+
+    if args.watch:
+        watch_directory(directory, use_polling=args.poll, jobs=args.jobs, conflict=args.on_conflict)
+        return
+
     # Organize files
-    order_files(directory)
+    stats = RunStats(profile=bool(args.profile)) if args.stats or args.profile else None
+    order_files(directory, jobs=args.jobs, use_index=args.index, incremental=args.incremental,
+                depth=depth, exclude=args.exclude, scan_workers=args.scan_workers,
+                dedupe=args.dedupe, sniff=args.sniff, conflict=args.on_conflict, stats=stats)
     logging.info(f"Archivos organizados en el directorio: {directory}")
-
+    if args.profile:
+        for path in stats.dump_profiles(args.profile):
+            logging.info(f"Perfil guardado en {path}")
+    if args.stats:
+        print(stats.report(args.stats))
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,61 @@
+"""
+File organizer engine, without CLI or GUI.
+
+Importing the package has no side effects: nothing is read from disk,
+logging is left to the application (the package only logs through the
+"organizer" logger) and Qt is never imported. A typical embedding:
+
+    from organizer import load_rules, plan, apply
+
+    rules = load_rules("/etc/organizer/rules.json")
+    for directory in incoming:
+        apply(plan(directory, rules))
+"""
+import logging
+
+from .api import apply, plan, render_tree, scan
+from .dedupe import (DEDUPE_MODES, DIGEST_CACHE_SIZE, DUPLICATES_DIR, dedupe_plan, file_digest,
+                     find_duplicates)
+from .index import METADATA_DIR, MetadataIndex
+from .journal import (JOURNAL_DIR, JOURNAL_KEEP, MoveJournal, incomplete_runs, journal_path,
+                      new_run_id, prune_journals, read_journal, recover_runs, undo_run)
+from .moves import (CONFLICT_POLICIES, ConflictResolver, MovePlan, MoveResult, PlannedMove,
+                    apply_plan, execute_links, execute_moves, iter_apply_plan, link_file,
+                    load_plan, move_file, plan_root, save_plan)
+from .planner import plan_directory, plan_files
+from .rules import (RULE_PRECEDENCE, ContainsMatcher, RegexMatcher, RuleSet, compile_rules,
+                    load_rules, save_rules, sniff_extension)
+from .stats import STATS_FORMATS, RunStats, measure
+from .tree import (TREE_FORMATS, generate_tree, iter_tree, iter_tree_stats, save_tree,
+                   tree_stats, write_tree)
+from .walk import FileEntry, ScandirPrefetcher, walk_tree
+
+__all__ = [
+    # api
+    "apply", "plan", "render_tree", "scan",
+    # dedupe
+    "DEDUPE_MODES", "DIGEST_CACHE_SIZE", "DUPLICATES_DIR", "dedupe_plan", "file_digest", "find_duplicates",
+    # index
+    "METADATA_DIR", "MetadataIndex",
+    # journal
+    "JOURNAL_DIR", "JOURNAL_KEEP", "MoveJournal", "incomplete_runs", "journal_path", "new_run_id",
+    "prune_journals", "read_journal", "recover_runs", "undo_run",
+    # moves
+    "CONFLICT_POLICIES", "ConflictResolver", "MovePlan", "MoveResult", "PlannedMove", "apply_plan",
+    "execute_links", "execute_moves", "iter_apply_plan", "link_file", "load_plan", "move_file",
+    "plan_root", "save_plan",
+    # planner
+    "plan_directory", "plan_files",
+    # rules
+    "RULE_PRECEDENCE", "ContainsMatcher", "RegexMatcher", "RuleSet", "compile_rules", "load_rules",
+    "save_rules", "sniff_extension",
+    # stats
+    "STATS_FORMATS", "RunStats", "measure",
+    # tree
+    "TREE_FORMATS", "generate_tree", "iter_tree", "iter_tree_stats", "save_tree", "tree_stats",
+    "write_tree",
+    # walk
+    "FileEntry", "ScandirPrefetcher", "walk_tree",
+]
+
+logging.getLogger(__name__).addHandler(logging.NullHandler())
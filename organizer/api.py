@@ -0,0 +1,115 @@
+import io
+import time
+
+from .dedupe import dedupe_plan
+from .moves import apply_plan
+from .planner import plan_directory
+from .rules import RULE_PRECEDENCE, compile_rules
+from .stats import measure
+from .tree import write_tree
+from .walk import ScandirPrefetcher, walk_tree
+
+def scan(directory, rules, families=RULE_PRECEDENCE, depth=1, exclude=(), workers=1):
+    """
+    Classify the files of a directory tree without planning any move.
+
+    Args:
+        directory (str): Directory to scan.
+        rules (RuleSet or dict): Rules to classify with.
+        families (tuple, optional): Rule families to apply. Defaults to all.
+        depth (int, optional): Levels of subdirectories to descend into;
+            None for the whole tree. Defaults to 1.
+        exclude (tuple, optional): Glob patterns of files and directories to
+            leave out. Defaults to ().
+        workers (int, optional): Threads listing directories ahead of the
+            walk. Defaults to 1.
+
+    Yields:
+        tuple: (entry, match) for every regular file, where entry is its
+        os.DirEntry and match is (folder, "family:key") or None.
+    """
+    ruleset = compile_rules(rules)
+    now = time.time()
+    prefetcher = ScandirPrefetcher(workers) if workers > 1 else None
+    try:
+        for _, files in walk_tree(directory, depth, exclude, directory, prefetcher):
+            for entry in files:
+                yield entry, ruleset.classify(entry, families, now)
+    finally:
+        if prefetcher:
+            prefetcher.close()
+
+def plan(directory, rules, families=RULE_PRECEDENCE, flatten=True, incremental=False, depth=1,
+         exclude=(), workers=1, sniff=False, conflict="rename", dedupe=None, index=None,
+         stats=None):
+    """
+    Compute the moves that would organize a directory.
+
+    Nothing is moved; see plan_directory and dedupe_plan for the details of
+    each option.
+
+    Args:
+        directory (str): Directory to organize.
+        rules (RuleSet or dict): Rules to classify with.
+        families (tuple, optional): Rule families to apply. Defaults to all.
+        flatten (bool, optional): Pull files up from subdirectories first. Defaults to True.
+        incremental (bool, optional): Leave correctly placed files alone. Defaults to False.
+        depth (int, optional): Levels of subdirectories to organize; None for
+            the whole tree. Defaults to 1.
+        exclude (tuple, optional): Glob patterns to leave alone. Defaults to ().
+        workers (int, optional): Threads listing and reading files. Defaults to 1.
+        sniff (bool, optional): Classify unmatched files by content. Defaults to False.
+        conflict (str, optional): One of CONFLICT_POLICIES. Defaults to "rename".
+        dedupe (str, optional): One of DEDUPE_MODES, or None. Defaults to None.
+        index (MetadataIndex, optional): Index of a previous run. Defaults to None.
+        stats (RunStats, optional): Record the "plan" and "dedupe" stages.
+            Defaults to None.
+
+    Returns:
+        MovePlan: The planned moves.
+    """
+    with measure(stats, "plan"):
+        moves = plan_directory(directory, rules, families, flatten=flatten, index=index,
+                               incremental=incremental, depth=depth, exclude=exclude,
+                               workers=workers, sniff=sniff, conflict=conflict, stats=stats)
+    if dedupe:
+        with measure(stats, "dedupe"):
+            moves = dedupe_plan(moves, directory, dedupe, jobs=max(workers, 4))
+    return moves
+
+def apply(moves, jobs=1, journal=None, stats=None):
+    """
+    Carry out a plan returned by plan (see apply_plan).
+
+    Args:
+        moves (list): PlannedMove entries.
+        jobs (int, optional): Worker threads for the moves. Defaults to 1.
+        journal (MoveJournal, optional): Journal to record the run in. Defaults to None.
+        stats (RunStats, optional): Record the "move" stage. Defaults to None.
+
+    Returns:
+        list: MoveResult for every planned move.
+    """
+    with measure(stats, "move"):
+        return apply_plan(moves, jobs=jobs, journal=journal, stats=stats)
+
+def render_tree(directory, max_depth=None, output_format="text", workers=1, output=None):
+    """
+    Render the tree of a directory (see write_tree for the formats).
+
+    Args:
+        directory (str): Directory to render.
+        max_depth (int, optional): Maximum depth to output. Defaults to None.
+        output_format (str, optional): One of TREE_FORMATS. Defaults to "text".
+        workers (int, optional): Parallel listing threads. Defaults to 1.
+        output (file, optional): Text stream to write to. Defaults to None.
+
+    Returns:
+        str: The rendered tree, or None when it was written to output.
+    """
+    if output is not None:
+        write_tree(output, directory, max_depth, output_format, workers)
+        return None
+    buffer = io.StringIO()
+    write_tree(buffer, directory, max_depth, output_format, workers)
+    return buffer.getvalue()
@@ -0,0 +1,235 @@
+import logging
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from hashlib import sha1
+
+from .moves import ConflictResolver, MovePlan, PlannedMove
+from .walk import _list_dir
+
+logger = logging.getLogger(__name__)
+
+# Bloque leído al principio y al final de cada archivo para el hash parcial
+HASH_BLOCK = 64 * 1024
+
+# Tamaño del búfer reutilizado por cada hilo para el hash completo
+HASH_BUFFER = 1024 * 1024
+
+DEDUPE_MODES = ("skip", "link", "move")
+
+DUPLICATES_DIR = "duplicates"
+
+# Hashes recordados entre llamadas; los menos usados se descartan primero
+DIGEST_CACHE_SIZE = 65536
+
+# Hashes ya calculados, por (dispositivo, inodo, tamaño, mtime, parcial)
+_digest_cache = OrderedDict()
+_digest_lock = threading.Lock()
+
+_hash_buffers = threading.local()
+
+def file_digest(path, st, partial=False):
+    """
+    SHA-1 of a file, or of its first and last HASH_BLOCK bytes.
+
+    Reads go into a per-thread buffer that is reused across files, and
+    results are cached by inode, size and mtime in an LRU of the last
+    DIGEST_CACHE_SIZE digests, so an unchanged file is not hashed again by
+    later runs of a long-lived process while it is still in the cache.
+
+    Args:
+        path (str): Path of the file.
+        st (os.stat_result): Its stat result.
+        partial (bool, optional): Hash only the first and last blocks. Defaults to False.
+
+    Returns:
+        str: Hex digest.
+    """
+    key = (st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns, partial)
+    with _digest_lock:
+        digest = _digest_cache.get(key)
+        if digest is not None:
+            _digest_cache.move_to_end(key)
+            return digest
+
+    buffer = getattr(_hash_buffers, "view", None)
+    if buffer is None:
+        buffer = _hash_buffers.view = memoryview(bytearray(HASH_BUFFER))
+
+    hasher = sha1()
+    with open(path, "rb", buffering=0) as f:
+        if partial:
+            read = f.readinto(buffer[:HASH_BLOCK])
+            hasher.update(buffer[:read])
+            if st.st_size > HASH_BLOCK:
+                f.seek(max(HASH_BLOCK, st.st_size - HASH_BLOCK))
+                read = f.readinto(buffer[:HASH_BLOCK])
+                hasher.update(buffer[:read])
+        else:
+            while True:
+                read = f.readinto(buffer)
+                if not read:
+                    break
+                hasher.update(buffer[:read])
+
+    digest = hasher.hexdigest()
+    with _digest_lock:
+        _digest_cache[key] = digest
+        if len(_digest_cache) > DIGEST_CACHE_SIZE:
+            _digest_cache.popitem(last=False)
+    return digest
+
+def _safe_digest(path, st, partial):
+    try:
+        return file_digest(path, st, partial)
+    except OSError as e:
+        logger.error(f"Error al leer archivo {os.path.basename(path)}: {e}")
+        return None
+
+def find_duplicates(files, jobs=4):
+    """
+    Group files with identical content.
+
+    Files are grouped by size first; only sizes shared by several files are
+    hashed, on their first and last blocks, and only files that still
+    collide and are larger than two blocks get a full hash. Empty files and
+    unreadable ones are never reported.
+
+    Args:
+        files (list): (path, stat_result) pairs.
+        jobs (int, optional): Threads hashing files. Defaults to 4.
+
+    Returns:
+        list: Lists of indices into files, one per set of identical files, in input order.
+    """
+    by_size = {}
+    for position, (_, st) in enumerate(files):
+        if st.st_size:
+            by_size.setdefault(st.st_size, []).append(position)
+    groups = [group for group in by_size.values() if len(group) > 1]
+
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as pool:
+        def refine(groups, partial):
+            positions = [position for group in groups for position in group]
+            digests = dict(zip(positions, pool.map(
+                lambda position: _safe_digest(*files[position], partial), positions)))
+            refined = []
+            for group in groups:
+                by_digest = {}
+                for position in group:
+                    if digests[position] is not None:
+                        by_digest.setdefault(digests[position], []).append(position)
+                refined.extend(same for same in by_digest.values() if len(same) > 1)
+            return refined
+
+        groups = refine(groups, partial=True)
+        # Hasta dos bloques el hash parcial ya cubre todo el archivo
+        whole = [group for group in groups if files[group[0]][1].st_size <= 2 * HASH_BLOCK]
+        larger = [group for group in groups if files[group[0]][1].st_size > 2 * HASH_BLOCK]
+        groups = whole + refine(larger, partial=False)
+
+    return sorted(groups)
+
+def dedupe_plan(plan, directory, mode="skip", jobs=4):
+    """
+    Find the files of a plan that duplicate another one and deal with them.
+
+    Every file the plan moves is compared with the other moved files and
+    with the files already in the plan's target directories. In each set of
+    identical files the copy already in place, or else the first one
+    planned, is kept; the others are:
+
+    - skip: left where they are, out of the plan.
+    - link: placed as planned, but as hard links to the kept copy (or linked
+      where they are if the kept copy already has their destination).
+    - move: moved to DUPLICATES_DIR inside the directory instead, renamed
+      to "name (n).ext" if needed.
+
+    Files already in place, including those the plan pulls up and sorts
+    back to the same path, are never touched.
+
+    Args:
+        plan (MovePlan): Plan returned by plan_directory.
+        directory (str): The organized directory.
+        mode (str, optional): One of DEDUPE_MODES. Defaults to "skip".
+        jobs (int, optional): Threads hashing files. Defaults to 4.
+
+    Returns:
+        MovePlan: The new plan; its duplicates attribute counts the duplicates found.
+    """
+    if mode not in DEDUPE_MODES:
+        raise ValueError(f"Modo de duplicados desconocido: {mode}")
+
+    # Seguir cada archivo a través de sus movimientos (aplanado y clasificación)
+    chains = []
+    current = {}
+    for move in plan:
+        chain = current.pop(move.source, None)
+        if chain is None:
+            chain = {"origin": move.source, "moves": []}
+            chains.append(chain)
+        chain["final"] = move.destination
+        chain["moves"].append(move)
+        current[move.destination] = chain
+
+    files = []
+    owners = []
+    for chain in chains:
+        try:
+            files.append((chain["origin"], os.stat(chain["origin"])))
+            owners.append(chain)
+        except OSError:
+            continue
+
+    # Archivos que ya están en los directorios destino y no se mueven
+    sizes = {st.st_size for _, st in files}
+    origins = {chain["origin"] for chain in chains}
+    for target_dir in dict.fromkeys(os.path.dirname(chain["final"]) for chain in chains):
+        try:
+            entries = _list_dir(target_dir)
+        except OSError:
+            continue
+        for entry in entries:
+            if entry.path in origins or not entry.is_file(follow_symlinks=False):
+                continue
+            st = entry.stat(follow_symlinks=False)
+            if st.st_size in sizes:
+                files.append((entry.path, st))
+                owners.append(None)
+
+    def stays(position):
+        # Un archivo que se aplana y vuelve a su misma ruta ya está en su sitio
+        chain = owners[position]
+        return chain is None or chain["origin"] == chain["final"]
+
+    replaced = {}
+    duplicates = ConflictResolver("rename")
+    for group in find_duplicates(files, jobs=jobs):
+        in_place = [position for position in group if stays(position)]
+        keeper = in_place[0] if in_place else group[0]
+        kept = owners[keeper]["final"] if owners[keeper] is not None else files[keeper][0]
+        rule = f"duplicate:{os.path.relpath(kept, directory)}"
+        for position in group:
+            chain = owners[position]
+            if position == keeper or stays(position):
+                continue
+            if mode == "skip":
+                replaced[id(chain)] = None
+            elif mode == "move":
+                destination = duplicates.claim(
+                    chain["origin"],
+                    os.path.join(directory, DUPLICATES_DIR, os.path.basename(chain["origin"])))
+                replaced[id(chain)] = PlannedMove(chain["origin"], destination, rule)
+            else:
+                destination = chain["final"] if chain["final"] != kept else chain["origin"]
+                replaced[id(chain)] = PlannedMove(chain["origin"], destination, rule, kept)
+
+    deduped = MovePlan(
+        move for chain in chains if id(chain) not in replaced for move in chain["moves"])
+    deduped.extend(move for move in replaced.values() if move is not None)
+    deduped.in_place = plan.in_place
+    deduped.unmatched = plan.unmatched
+    deduped.skipped = plan.skipped
+    deduped.duplicates = len(replaced)
+    return deduped
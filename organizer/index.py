@@ -0,0 +1,163 @@
+import os
+import sqlite3
+
+# Carpeta con los metadatos del organizador dentro del directorio organizado;
+# nunca se aplana ni se clasifica.
+METADATA_DIR = ".organizer"
+
+class MetadataIndex:
+    """
+    SQLite index of the files an organize run has already placed.
+
+    It lives in METADATA_DIR inside the organized directory and records, for
+    every file, its path, size, mtime, inode and assigned destination, plus
+    the mtime of the root and of each first-level subdirectory. Later runs
+    skip directories whose mtime did not change and files whose metadata
+    still matches, so an unchanged tree costs one stat per directory.
+
+    Files are classified when first seen or changed; a change in the rules
+    invalidates the whole index.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(os.path.join(directory, METADATA_DIR), exist_ok=True)
+        self.conn = sqlite3.connect(os.path.join(directory, METADATA_DIR, "index.sqlite"))
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+            CREATE TABLE IF NOT EXISTS dirs (path TEXT PRIMARY KEY, mtime_ns INTEGER);
+            CREATE TABLE IF NOT EXISTS files (
+                path TEXT PRIMARY KEY, parent TEXT, size INTEGER,
+                mtime_ns INTEGER, inode INTEGER, destination TEXT
+            );
+        """)
+        self._known = {}
+        self._seen = {}
+        self._observed = []
+
+    def _relpath(self, path):
+        relative = os.path.relpath(path, self.directory)
+        return "" if relative == "." else relative
+
+    def check_rules(self, rules_key):
+        """
+        Drop the index if it was built with different rules.
+
+        Args:
+            rules_key (str): Canonical serialization of the rules in use.
+        """
+        row = self.conn.execute("SELECT value FROM meta WHERE key = 'rules'").fetchone()
+        if row is None or row[0] != rules_key:
+            with self.conn:
+                self.conn.execute("DELETE FROM dirs")
+                self.conn.execute("DELETE FROM files")
+                self.conn.execute("INSERT OR REPLACE INTO meta VALUES ('rules', ?)", (rules_key,))
+
+    def dir_changed(self, path):
+        """Return True if a directory is unknown or its mtime changed since the last run."""
+        row = self.conn.execute("SELECT mtime_ns FROM dirs WHERE path = ?", (self._relpath(path),)).fetchone()
+        try:
+            return row is None or os.stat(path).st_mtime_ns != row[0]
+        except OSError:
+            return True
+
+    def tree_changed(self):
+        """
+        Return True if the root or any known subdirectory changed since the last run.
+
+        A root left out by commit() because some of its files failed to move
+        counts as changed too.
+        """
+        rows = self.conn.execute("SELECT path, mtime_ns FROM dirs").fetchall()
+        if not any(path == "" for path, _ in rows):
+            return True
+        for path, mtime_ns in rows:
+            try:
+                if os.stat(os.path.join(self.directory, path)).st_mtime_ns != mtime_ns:
+                    return True
+            except OSError:
+                return True
+        return False
+
+    def in_place(self, entry):
+        """Return True if a file is recorded at its current path with unchanged metadata."""
+        parent = self._relpath(os.path.dirname(entry.path))
+        known = self._known.get(parent)
+        if known is None:
+            rows = self.conn.execute(
+                "SELECT path, size, mtime_ns, inode FROM files WHERE parent = ?", (parent,)
+            )
+            known = self._known[parent] = {row[0]: row[1:] for row in rows}
+        row = known.get(self._relpath(entry.path))
+        if row is None:
+            return False
+        st = entry.stat()
+        return row == (st.st_size, st.st_mtime_ns, entry.inode())
+
+    def scanned(self, path, names):
+        """
+        Mark a directory as fully listed by the current plan.
+
+        Args:
+            path (str): Directory that was listed.
+            names (list): Names of the files found in it.
+        """
+        self._seen[self._relpath(path)] = set(names)
+
+    def observe(self, source, destination, folder):
+        """
+        Remember where a planned file will end up.
+
+        Args:
+            source (str): Current path of the file.
+            destination (str): Path the file will have once the plan is applied.
+            folder (str): Rule folder assigned to the file, or None.
+        """
+        self._observed.append((source, destination, folder))
+
+    def commit(self):
+        """
+        Record the outcome of the applied plan.
+
+        Files that did not reach their planned destination are left out and
+        their original directory is marked as changed, so the next run
+        retries them.
+        """
+        dirty = set()
+        stale = []
+        for parent, names in self._seen.items():
+            for (path,) in self.conn.execute("SELECT path FROM files WHERE parent = ?", (parent,)):
+                if os.path.basename(path) not in names:
+                    stale.append((path,))
+
+        rows = []
+        for source, destination, folder in self._observed:
+            stale.append((self._relpath(source),))
+            try:
+                st = os.stat(destination)
+            except OSError:
+                dirty.add(self._relpath(os.path.dirname(source)))
+                continue
+            relative = self._relpath(destination)
+            rows.append((relative, os.path.dirname(relative), st.st_size,
+                         st.st_mtime_ns, st.st_ino, folder or ""))
+
+        with self.conn:
+            self.conn.executemany("DELETE FROM files WHERE path = ?", stale)
+            self.conn.executemany("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?)", rows)
+            self.conn.execute("DELETE FROM dirs")
+            dirs = [("", os.stat(self.directory).st_mtime_ns)]
+            with os.scandir(self.directory) as it:
+                for entry in it:
+                    if entry.name != METADATA_DIR and entry.is_dir():
+                        dirs.append((entry.name, entry.stat().st_mtime_ns))
+            self.conn.executemany(
+                "INSERT INTO dirs VALUES (?, ?)",
+                [(path, mtime_ns) for path, mtime_ns in dirs if path not in dirty]
+            )
+        self._known.clear()
+        self._seen.clear()
+        self._observed.clear()
+
+    def close(self):
+        self.conn.close()
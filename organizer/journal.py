@@ -0,0 +1,309 @@
+import errno
+import json
+import logging
+import os
+import secrets
+import shutil
+import time
+
+from .index import METADATA_DIR
+from .moves import MovePlan, MoveResult, PlannedMove, _phase, apply_plan, move_file
+
+logger = logging.getLogger(__name__)
+
+JOURNAL_DIR = os.path.join(METADATA_DIR, "journal")
+
+# Registros acumulados antes de escribirlos al diario con un único fsync
+JOURNAL_BATCH = 512
+
+# Diarios de ejecuciones terminadas que se conservan por directorio
+JOURNAL_KEEP = 100
+
+# Sufijo de los diarios de ejecuciones terminadas o deshechas
+DONE_SUFFIX = ".done.ndjson"
+
+def new_run_id():
+    """Return a run identifier that sorts by start time and is unique across processes."""
+    now = time.time()
+    return (f"{time.strftime('%Y%m%dT%H%M%S', time.localtime(now))}-"
+            f"{int(now % 1 * 1_000_000):06d}-{secrets.token_hex(4)}")
+
+class MoveJournal:
+    """
+    Append-only NDJSON journal of an organize run, for undo and crash recovery.
+
+    Each run gets its own file, JOURNAL_DIR/<run_id>.ndjson inside the
+    organized directory, with paths stored relative to it:
+
+    - a "begin" record and the whole plan as numbered "move" records,
+      written and fsync'ed before the first file is moved;
+    - "done" records for the moves that succeeded, buffered and written
+      with one fsync every JOURNAL_BATCH records and after each phase;
+    - an "end" record once the run finishes ("undone" after an undo).
+
+    When a finished journal is closed it is renamed to <run_id>.done.ndjson,
+    so incomplete runs can be found without reading every journal, and only
+    the JOURNAL_KEEP most recent finished journals are kept (see
+    prune_journals). A journal with neither "end" nor "undone" belongs to an
+    incomplete run (see incomplete_runs and recover_runs).
+
+    Args:
+        directory (str): The organized directory.
+        run_id (str, optional): Existing run to append to. Defaults to a new
+            run, whose journal must not exist yet.
+    """
+
+    def __init__(self, directory, run_id=None):
+        self.directory = directory
+        self.run_id = run_id or new_run_id()
+        self.path = journal_path(directory, self.run_id)
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._file = open(self.path, "a" if run_id else "x", encoding="utf-8")
+        self._buffer = []
+        self._finished = False
+
+    def _relpath(self, path):
+        return path if path is None else os.path.relpath(path, self.directory)
+
+    def _write(self, record):
+        self._buffer.append(json.dumps(record, ensure_ascii=False))
+        if len(self._buffer) >= JOURNAL_BATCH:
+            self.flush()
+
+    def flush(self):
+        """Write the buffered records and fsync the journal."""
+        if not self._buffer:
+            return
+        self._file.write("\n".join(self._buffer) + "\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._buffer.clear()
+
+    def begin(self, plan):
+        """Record the plan of the run; it is on disk when this returns."""
+        self._write({"op": "begin", "run": self.run_id, "time": time.time()})
+        for number, move in enumerate(plan):
+            self._write({
+                "op": "move", "n": number, "source": self._relpath(move.source),
+                "destination": self._relpath(move.destination), "rule": move.rule,
+                "link_to": self._relpath(move.link_to),
+            })
+        self.flush()
+
+    def done(self, numbers):
+        """Record the moves, by plan number, that completed."""
+        for number in numbers:
+            self._write({"op": "done", "n": number})
+        self.flush()
+
+    def end(self, op="end"):
+        """Mark the run as finished."""
+        self._write({"op": op, "time": time.time()})
+        self.flush()
+        self._finished = True
+
+    def close(self):
+        self.flush()
+        self._file.close()
+        if self._finished and not self.path.endswith(DONE_SUFFIX):
+            done_path = os.path.join(os.path.dirname(self.path), self.run_id + DONE_SUFFIX)
+            os.replace(self.path, done_path)
+            self.path = done_path
+            prune_journals(self.directory)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+def journal_path(directory, run_id):
+    """Return the path of the journal of a run, finished or not."""
+    done_path = os.path.join(directory, JOURNAL_DIR, run_id + DONE_SUFFIX)
+    if os.path.exists(done_path):
+        return done_path
+    return os.path.join(directory, JOURNAL_DIR, f"{run_id}.ndjson")
+
+def prune_journals(directory, keep=JOURNAL_KEEP):
+    """
+    Delete the oldest finished journals of a directory, keeping the last keep.
+
+    Journals of incomplete runs are never deleted.
+
+    Args:
+        directory (str): The organized directory.
+        keep (int, optional): Finished journals to keep. Defaults to JOURNAL_KEEP.
+
+    Returns:
+        list: Identifiers of the runs whose journal was deleted.
+    """
+    try:
+        names = sorted(name for name in os.listdir(os.path.join(directory, JOURNAL_DIR))
+                       if name.endswith(DONE_SUFFIX))
+    except OSError:
+        return []
+    pruned = []
+    for name in names[:max(0, len(names) - keep)]:
+        try:
+            os.unlink(os.path.join(directory, JOURNAL_DIR, name))
+            pruned.append(name[:-len(DONE_SUFFIX)])
+        except OSError as e:
+            logger.warning(f"No se pudo borrar el diario {name}: {e}")
+    return pruned
+
+def read_journal(directory, run_id):
+    """
+    Read the journal of a run.
+
+    For an incomplete run, moves without a "done" record whose source is
+    gone and whose destination exists are taken as done too, since the last
+    batch of records may not have reached the disk.
+
+    Args:
+        directory (str): The organized directory.
+        run_id (str): Identifier of the run.
+
+    Returns:
+        tuple: (moves, done, status): PlannedMove entries in plan order, the
+        set of plan numbers that completed, and "end", "undone" or None for
+        an incomplete run.
+    """
+    def absolute(path):
+        return None if path is None else os.path.join(directory, path)
+
+    moves, done, status = [], set(), None
+    with open(journal_path(directory, run_id), "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # Última línea a medio escribir
+                continue
+            op = record["op"]
+            if op == "move":
+                moves.append(PlannedMove(absolute(record["source"]), absolute(record["destination"]),
+                                         record["rule"], absolute(record["link_to"])))
+            elif op == "done":
+                done.add(record["n"])
+            elif op in ("end", "undone"):
+                status = op
+
+    if status is None:
+        done.update(
+            number for number, move in enumerate(moves)
+            if number not in done and move.source != move.destination
+            and not os.path.lexists(move.source) and os.path.lexists(move.destination)
+        )
+    return moves, done, status
+
+def incomplete_runs(directory):
+    """
+    List the runs whose journal was never finished.
+
+    Finished journals are told apart by their name alone; only the journals
+    left without the .done suffix are read, and those that turn out to be
+    finished (a crash between the "end" record and the rename) are renamed.
+
+    Args:
+        directory (str): The organized directory.
+
+    Returns:
+        list: Run identifiers, oldest first.
+    """
+    try:
+        names = sorted(os.listdir(os.path.join(directory, JOURNAL_DIR)))
+    except OSError:
+        return []
+    runs = []
+    for name in names:
+        if not name.endswith(".ndjson") or name.endswith(DONE_SUFFIX):
+            continue
+        run_id = name[:-len(".ndjson")]
+        if read_journal(directory, run_id)[2] is None:
+            runs.append(run_id)
+            continue
+        try:
+            os.replace(journal_path(directory, run_id),
+                       os.path.join(directory, JOURNAL_DIR, run_id + DONE_SUFFIX))
+        except OSError:
+            pass
+    return runs
+
+def _undo_move(move):
+    if move.link_to is not None:
+        # El duplicado se reemplazó por un enlace duro: restaurar una copia independiente
+        temporary = f"{move.source}.{os.getpid()}.undo"
+        shutil.copy2(move.destination, temporary)
+        os.replace(temporary, move.source)
+        if move.destination != move.source:
+            os.unlink(move.destination)
+        return
+    if os.path.lexists(move.source):
+        raise FileExistsError(errno.EEXIST, "el origen ya existe", move.source)
+    os.makedirs(os.path.dirname(move.source), exist_ok=True)
+    move_file(move.destination, move.source)
+
+def undo_run(directory, run_id):
+    """
+    Undo the moves of a run, in reverse order.
+
+    Files are put back where they were; a file is left alone if something
+    else now occupies its old path. Files overwritten during the run
+    (conflict policy "overwrite" or "newer") cannot be brought back.
+
+    Args:
+        directory (str): The organized directory.
+        run_id (str): Identifier of the run.
+
+    Returns:
+        list: MoveResult for every move undone, from destination back to source.
+    """
+    moves, done, status = read_journal(directory, run_id)
+    if status == "undone":
+        logger.warning(f"La ejecución {run_id} ya se había deshecho")
+        return []
+
+    results = []
+    for number in sorted(done, key=lambda number: (_phase(moves[number]), number), reverse=True):
+        move = moves[number]
+        try:
+            _undo_move(move)
+            results.append(MoveResult(move.destination, move.source, None))
+        except OSError as e:
+            logger.error(f"Error al restaurar archivo {os.path.basename(move.source)}: {e}")
+            results.append(MoveResult(move.destination, move.source, e))
+
+    with MoveJournal(directory, run_id) as journal:
+        journal.end("undone")
+    return results
+
+def recover_runs(directory, action="rollback", jobs=1):
+    """
+    Finish or roll back every incomplete run of a directory.
+
+    Args:
+        directory (str): The organized directory.
+        action (str, optional): "finish" to carry out the moves that are
+            still pending (as a new, journaled run) or "rollback" to undo
+            the ones that were done. Defaults to "rollback".
+        jobs (int, optional): Worker threads for the moves. Defaults to 1.
+
+    Returns:
+        list: Identifiers of the runs recovered.
+    """
+    runs = incomplete_runs(directory)
+    for run_id in runs:
+        if action == "rollback":
+            results = undo_run(directory, run_id)
+            logger.info(f"Ejecución {run_id} revertida: {len(results)} movimientos deshechos")
+            continue
+        moves, done, _ = read_journal(directory, run_id)
+        pending = MovePlan(move for number, move in enumerate(moves) if number not in done)
+        with MoveJournal(directory) as journal:
+            results = apply_plan(pending, jobs=jobs, journal=journal)
+        with MoveJournal(directory, run_id) as old_journal:
+            old_journal.end()
+        failed = sum(1 for result in results if result.error)
+        logger.info(f"Ejecución {run_id} completada como {journal.run_id}: "
+                     f"{len(results) - failed} movidos, {failed} errores")
+    return runs
@@ -0,0 +1,393 @@
+import errno
+import json
+import logging
+import os
+import shutil
+from collections import deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+MoveResult = namedtuple("MoveResult", ["source", "destination", "error"])
+
+def move_file(source, destination):
+    """
+    Move a single file in-process.
+
+    os.rename is used whenever source and destination share a filesystem;
+    only a cross-device move (EXDEV) falls back to copy-then-unlink.
+
+    Args:
+        source (str): Path of the file to move.
+        destination (str): Full destination path, including the file name.
+
+    Returns:
+        str: "rename" or "copy", depending on how the file was moved.
+    """
+    try:
+        os.rename(source, destination)
+        return "rename"
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
+    shutil.copy2(source, destination)
+    os.unlink(source)
+    return "copy"
+
+def _move_one(source, destination, stats=None):
+    try:
+        kind = move_file(source, destination)
+        if stats is not None:
+            stats.moved(kind, os.stat(destination).st_size if kind == "copy" else 0)
+        return MoveResult(source, destination, None)
+    except OSError as e:
+        logger.error(f"Error al mover archivo {os.path.basename(source)}: {e}")
+        if stats is not None:
+            stats.error(e)
+        return MoveResult(source, destination, e)
+
+def execute_moves(moves, jobs=1, per_device=2, stats=None):
+    """
+    Carry out a batch of moves.
+
+    All target directories are created up front, once each, before any file
+    is moved. Failures are logged and reported but do not stop the batch.
+
+    With jobs > 1 the moves are grouped by target directory and the groups run
+    on a thread pool. Each group is moved serially, in order, and at most
+    per_device groups write to the same device at once, so the outcome is the
+    same as a serial run.
+
+    Args:
+        moves (list): (source, destination) pairs with full destination paths.
+        jobs (int, optional): Number of worker threads. Defaults to 1 (serial).
+        per_device (int, optional): Concurrent groups per target device. Defaults to 2.
+        stats (RunStats, optional): Count moves by kind, bytes copied and
+            errors. Defaults to None.
+
+    Returns:
+        list: MoveResult for every move, in the same order; error is None on success.
+    """
+    groups = {}
+    for index, (_, destination) in enumerate(moves):
+        groups.setdefault(os.path.dirname(destination), []).append(index)
+
+    for target_dir in groups:
+        try:
+            os.makedirs(target_dir, exist_ok=True)
+        except OSError as e:
+            logger.error(f"Error al crear directorio {target_dir}: {e}")
+            if stats is not None:
+                stats.error(e)
+
+    if jobs <= 1 or len(groups) < 2:
+        return [_move_one(source, destination, stats) for source, destination in moves]
+
+    # Agrupar los directorios destino por dispositivo
+    devices = {}
+    for target_dir, indices in groups.items():
+        try:
+            device = os.stat(target_dir).st_dev
+        except OSError:
+            device = None
+        devices.setdefault(device, deque()).append(indices)
+
+    results = [None] * len(moves)
+
+    def drain(queue):
+        # Cada tarea toma grupos completos de la cola de su dispositivo
+        while True:
+            try:
+                indices = queue.popleft()
+            except IndexError:
+                return
+            for index in indices:
+                results[index] = _move_one(*moves[index], stats)
+
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        futures = [
+            pool.submit(drain, queue)
+            for queue in devices.values()
+            for _ in range(min(per_device, len(queue)))
+        ]
+        for future in futures:
+            future.result()
+
+    return results
+
+def link_file(source, destination, target):
+    """
+    Replace a file by a hard link to an identical one.
+
+    The link is created at destination and then source is removed; when
+    destination is source itself the link replaces it atomically.
+
+    Args:
+        source (str): Path of the duplicate file.
+        destination (str): Where the link should end up.
+        target (str): Path of the copy that is kept.
+    """
+    if destination == source:
+        temporary = f"{source}.{os.getpid()}.link"
+        os.link(target, temporary)
+        os.replace(temporary, source)
+        return
+    os.link(target, destination)
+    os.unlink(source)
+
+def execute_links(links, stats=None):
+    """
+    Carry out a batch of hard-link replacements, serially and in order.
+
+    Args:
+        links (list): (source, destination, target) triples, see link_file.
+        stats (RunStats, optional): Count the links and errors. Defaults to None.
+
+    Returns:
+        list: MoveResult for every link, in the same order.
+    """
+    results = []
+    for source, destination, target in links:
+        try:
+            link_file(source, destination, target)
+            if stats is not None:
+                stats.moved("link")
+            results.append(MoveResult(source, destination, None))
+        except OSError as e:
+            logger.error(f"Error al enlazar archivo {os.path.basename(source)}: {e}")
+            if stats is not None:
+                stats.error(e)
+            results.append(MoveResult(source, destination, e))
+    return results
+
+# link_to solo se usa en los duplicados que se reemplazan por un enlace duro
+PlannedMove = namedtuple("PlannedMove", ["source", "destination", "rule", "link_to"],
+                         defaults=[None])
+
+CONFLICT_POLICIES = ("skip", "overwrite", "rename", "newer")
+
+class ConflictResolver:
+    """
+    Decide where a planned move goes when its destination name is taken.
+
+    Each target directory is listed once, the first time a move is planned
+    into it; from then on the names it holds, plus the ones claimed by
+    earlier moves of the run, are tracked in memory. Policies:
+
+    - skip: leave the file where it is.
+    - overwrite: replace the existing file.
+    - rename: use the first free "name (n).ext"; a counter per name makes
+      this O(1) amortized, with no stat calls.
+    - newer: replace the existing file only if the incoming one is newer.
+
+    Args:
+        policy (str, optional): One of CONFLICT_POLICIES. Defaults to "rename".
+    """
+
+    def __init__(self, policy="rename"):
+        if policy not in CONFLICT_POLICIES:
+            raise ValueError(f"Política de conflictos desconocida: {policy}")
+        self.policy = policy
+        # Directorio -> {nombre: ruta del archivo que lo ocupa en esta ejecución, o None}
+        self._names = {}
+        self._counters = {}
+
+    def _listing(self, directory):
+        names = self._names.get(directory)
+        if names is None:
+            try:
+                names = dict.fromkeys(os.listdir(directory))
+            except OSError:
+                names = {}
+            self._names[directory] = names
+        return names
+
+    def release(self, path):
+        """Free the name of a file that is moved away before later moves run."""
+        self._listing(os.path.dirname(path)).pop(os.path.basename(path), None)
+
+    def claim(self, source, destination, current=None):
+        """
+        Reserve a destination for a move.
+
+        Args:
+            source (str): Path of the file to move.
+            destination (str): Wanted destination path.
+            current (str, optional): Path the file has now, when source is
+                where earlier moves of the plan will put it; the "newer"
+                policy compares this file. Defaults to source.
+
+        Returns:
+            str: Destination to use (possibly renamed), or None to skip the move.
+        """
+        if source == destination:
+            return destination
+        current = current or source
+        target_dir, name = os.path.split(destination)
+        names = self._listing(target_dir)
+        if name in names:
+            occupant = names[name] or destination
+            if self.policy == "skip" or (self.policy == "newer" and not self._newer(current, occupant)):
+                logger.warning(f"Se omite {source}: ya existe {name} en {target_dir}")
+                return None
+            if self.policy == "rename":
+                stem, extension = os.path.splitext(name)
+                key = (target_dir, name)
+                counter = self._counters.get(key, 1)
+                while f"{stem} ({counter}){extension}" in names:
+                    counter += 1
+                self._counters[key] = counter + 1
+                name = f"{stem} ({counter}){extension}"
+                destination = os.path.join(target_dir, name)
+        names[name] = current
+        return destination
+
+    @staticmethod
+    def _newer(source, occupant):
+        try:
+            occupant_mtime = os.stat(occupant).st_mtime
+        except OSError:
+            return True
+        try:
+            return os.stat(source).st_mtime > occupant_mtime
+        except OSError:
+            return False
+
+class MovePlan(list):
+    """
+    List of PlannedMove entries that also counts the files left untouched.
+
+    Attributes:
+        in_place (int): Files examined that are already where the rules want them.
+        unmatched (int): Files left where they are because no rule matched them.
+        skipped (int): Files left where they are by the conflict policy.
+        duplicates (int): Files found to duplicate another one (see dedupe_plan).
+    """
+
+    def __init__(self, moves=()):
+        super().__init__(moves)
+        self.in_place = 0
+        self.unmatched = 0
+        self.skipped = 0
+        self.duplicates = 0
+
+def _phase(move):
+    # Orden de ejecución: aplanado, clasificación y por último los enlaces duros
+    if move.link_to is not None:
+        return 2
+    return 0 if move.rule == "flatten" else 1
+
+def iter_apply_plan(plan, jobs=1, journal=None, batch_size=None, stats=None):
+    """
+    Carry out a move plan batch by batch.
+
+    Moves run in the same order as apply_plan. The results of each batch
+    are yielded as soon as it finishes, so callers can report progress or
+    stop between batches; closing the generator early still marks the
+    journal as finished, with the moves done so far, while an exception
+    leaves the run incomplete for recover_runs.
+
+    Args:
+        plan (list): PlannedMove entries, as returned by plan_directory or load_plan.
+        jobs (int, optional): Worker threads for the moves. Defaults to 1.
+        journal (MoveJournal, optional): Journal to record the run in.
+            Defaults to None.
+        batch_size (int, optional): Moves per batch; None for one batch per
+            phase. Defaults to None.
+        stats (RunStats, optional): Count moves by kind, bytes copied and
+            errors. Defaults to None.
+
+    Yields:
+        list: MoveResult for every move of a batch.
+    """
+    phases = ([], [], [])
+    for number, move in enumerate(plan):
+        phases[_phase(move)].append(number)
+    if journal is not None:
+        journal.begin(plan)
+
+    try:
+        for phase, numbers in enumerate(phases):
+            step = batch_size or len(numbers) or 1
+            for start in range(0, len(numbers), step):
+                chunk = numbers[start:start + step]
+                if phase < 2:
+                    batch = execute_moves([(plan[n].source, plan[n].destination) for n in chunk],
+                                          jobs=jobs, stats=stats)
+                else:
+                    batch = execute_links([(plan[n].source, plan[n].destination, plan[n].link_to)
+                                           for n in chunk], stats)
+                if journal is not None:
+                    journal.done(n for n, result in zip(chunk, batch) if result.error is None)
+                yield batch
+    except GeneratorExit:
+        # Detenido a propósito entre lotes: la ejecución queda cerrada
+        if journal is not None:
+            journal.end()
+        raise
+    if journal is not None:
+        journal.end()
+
+def apply_plan(plan, jobs=1, journal=None, stats=None):
+    """
+    Carry out a move plan.
+
+    Flatten moves are executed first, as a batch of their own, because the
+    classification moves of the same files depend on them. Hard links to
+    kept copies (see dedupe_plan) come last, once those copies are in place.
+
+    Args:
+        plan (list): PlannedMove entries, as returned by plan_directory or load_plan.
+        jobs (int, optional): Worker threads for the moves. Defaults to 1.
+        journal (MoveJournal, optional): Journal to record the run in, so
+            that it can be undone or recovered. Defaults to None.
+        stats (RunStats, optional): Count moves by kind, bytes copied and
+            errors. Defaults to None.
+
+    Returns:
+        list: MoveResult for every planned move, flatten moves first.
+    """
+    return [result for batch in iter_apply_plan(plan, jobs, journal, stats=stats) for result in batch]
+
+def save_plan(plan, output_file):
+    """
+    Save a move plan as JSON Lines, one move per line.
+
+    Args:
+        plan (list): PlannedMove entries.
+        output_file (str): Path to the output file.
+    """
+    with open(output_file, 'w', encoding='utf-8') as f:
+        for move in plan:
+            f.write(json.dumps(move._asdict(), ensure_ascii=False) + "\n")
+    logger.info(f"Plan de {len(plan)} movimientos guardado en: {output_file}")
+
+def plan_root(plan):
+    """
+    Return the deepest directory that contains every path of a plan.
+
+    For a plan made by plan_directory this is the organized directory, where
+    the run of the plan is journaled.
+
+    Args:
+        plan (list): PlannedMove entries.
+
+    Returns:
+        str: Absolute path of the directory, or None for an empty plan.
+    """
+    paths = [os.path.dirname(os.path.abspath(path)) for move in plan
+             for path in (move.source, move.destination)]
+    return os.path.commonpath(paths) if paths else None
+
+def load_plan(input_file):
+    """
+    Load a move plan saved by save_plan.
+
+    Args:
+        input_file (str): Path to the JSON Lines plan.
+
+    Returns:
+        list: PlannedMove entries in file order.
+    """
+    with open(input_file, 'r', encoding='utf-8') as f:
+        return [PlannedMove(**json.loads(line)) for line in f if line.strip()]
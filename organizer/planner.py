@@ -0,0 +1,247 @@
+import functools
+import json
+import os
+import time
+
+from .index import METADATA_DIR
+from .moves import ConflictResolver, MovePlan, PlannedMove
+from .rules import RULE_PRECEDENCE, compile_rules
+from .walk import FileEntry, ScandirPrefetcher, _is_excluded, _list_dir, walk_tree
+
+def plan_directory(directory, rules, families=RULE_PRECEDENCE, flatten=True, index=None,
+                   incremental=False, depth=1, exclude=(), workers=1, sniff=False,
+                   conflict="rename", stats=None):
+    """
+    Compute the moves an organize run would make, without touching the filesystem.
+
+    The directory, and when flattening each first-level subdirectory, is
+    scanned once. Flatten moves (files pulled back from subdirectories to the
+    root) come first in the plan, followed by one classification move for
+    every file that matched a rule (see RULE_PRECEDENCE). With a depth
+    greater than 1 (or None) deeper subdirectories are streamed through
+    walk_tree and their files flattened too.
+
+    In incremental mode files in subdirectories are classified where they
+    are: files already in their rule destination stay put, and misplaced
+    files get a single direct move instead of flatten + re-sort.
+
+    Args:
+        directory (str): Directory to organize.
+        rules (RuleSet or dict): Rules as loaded by load_rules.
+        families (tuple, optional): Rule families to apply. Defaults to all.
+        flatten (bool, optional): Plan the flatten step. Defaults to True.
+        index (MetadataIndex, optional): Skip unchanged directories and files
+            already placed by a previous run. Defaults to None.
+        incremental (bool, optional): Leave correctly placed files alone.
+            Defaults to False.
+        depth (int, optional): Levels of subdirectories to flatten; None for
+            the whole tree. Defaults to 1.
+        exclude (tuple, optional): Glob patterns of files and directories to
+            leave alone. Defaults to ().
+        workers (int, optional): Threads listing subdirectories ahead of the
+            scan (see ScandirPrefetcher). Defaults to 1.
+        sniff (bool, optional): Classify the files no rule matched by their
+            content, in one batch at the end (see RuleSet.classify_content).
+            Defaults to False.
+        conflict (str, optional): What to do when a destination name is
+            taken, one of CONFLICT_POLICIES (see ConflictResolver). Applies
+            to flatten and classification moves alike. Defaults to "rename".
+        stats (RunStats, optional): Count the entries scanned and time each
+            rule family. Defaults to None.
+
+    Returns:
+        MovePlan: PlannedMove entries in execution order; rule is "flatten"
+        or the "family:key" of the matched rule.
+    """
+    ruleset = compile_rules(rules)
+    resolver = ConflictResolver(conflict)
+    now = time.time()
+    plan = MovePlan()
+    classify = ruleset.classify if stats is None else functools.partial(ruleset.classify_timed,
+                                                                        stats=stats)
+
+    if index is not None:
+        index.check_rules(json.dumps([ruleset.raw, list(families), flatten, sniff], sort_keys=True))
+        # Los cambios por debajo del primer nivel no alteran los mtimes registrados
+        if depth == 1 and not index.tree_changed():
+            return plan
+
+    def is_new(entry):
+        if index is None:
+            return True
+        if stats is not None:
+            stats.count("stat_calls")
+        return not index.in_place(entry)
+
+    def scanned(entries):
+        if stats is not None:
+            stats.count("directories_scanned")
+            stats.count("entries_scanned", len(entries))
+
+    def classify_content(entries):
+        start = time.perf_counter()
+        sniffed = ruleset.classify_content([entry.path for entry in entries], max(workers, 4))
+        if stats is not None:
+            stats.family_time("magic", time.perf_counter() - start)
+        return sniffed
+
+    def record(match):
+        if stats is not None:
+            stats.match(match[1] if match else None)
+
+    def observe(source, destination, match):
+        if index is not None:
+            index.observe(source, destination, match[0] if match else None)
+
+    # Leer por adelantado los subdirectorios (y sus stat si las reglas los necesitan)
+    needs_stat = index is not None or bool(ruleset.raw.get("size_ranges") or ruleset.raw.get("date_ranges"))
+    prefetcher = ScandirPrefetcher(workers, stat=needs_stat) if workers > 1 else None
+    try:
+        entries = [
+            entry for entry in _list_dir(directory)
+            if entry.name != METADATA_DIR and not _is_excluded(entry.path, directory, exclude)
+        ]
+        scanned(entries)
+        # Nombre en la raíz -> archivo que se clasificará con ese nombre
+        files = {entry.name: entry for entry in entries if entry.is_file() and is_new(entry)}
+        if index is not None:
+            index.scanned(directory, [entry.name for entry in entries if entry.is_file()])
+
+        flatten_moves = []
+        if flatten:
+            subdirectories = [
+                entry for entry in entries
+                if entry.is_dir() and (index is None or depth != 1 or index.dir_changed(entry.path))
+            ]
+            if prefetcher:
+                prefetcher.prefetch(subdirectory.path for subdirectory in subdirectories)
+
+            def place(entry, match=None):
+                target = os.path.join(directory, entry.name)
+                if incremental:
+                    target = os.path.join(directory, match[0], entry.name) if match else target
+                    if os.path.normpath(target) == os.path.normpath(entry.path):
+                        plan.in_place += 1
+                        observe(entry.path, entry.path, match)
+                        return
+                destination = resolver.claim(entry.path, target)
+                if destination is None:
+                    plan.skipped += 1
+                    observe(entry.path, entry.path, None)
+                    return
+                if incremental and match:
+                    # Un único movimiento directo a su destino final
+                    plan.append(PlannedMove(entry.path, destination, match[1]))
+                    observe(entry.path, destination, match)
+                    return
+                # Los movimientos de aplanado se ejecutan antes que el resto
+                resolver.release(entry.path)
+                if incremental:
+                    plan.append(PlannedMove(entry.path, destination, "flatten"))
+                    observe(entry.path, destination, match)
+                else:
+                    flatten_moves.append(PlannedMove(entry.path, destination, "flatten"))
+                    files[os.path.basename(destination)] = entry
+
+            unmatched = []
+            for subdirectory in subdirectories:
+                max_depth = None if depth is None else depth - 1
+                for dirpath, items in walk_tree(subdirectory.path, max_depth, exclude, directory, prefetcher):
+                    scanned(items)
+                    if index is not None:
+                        index.scanned(dirpath, [entry.name for entry in items])
+                    for entry in items:
+                        if not is_new(entry):
+                            continue
+                        if not incremental:
+                            place(entry)
+                            continue
+                        match = classify(entry, families, now)
+                        if match is None and sniff:
+                            unmatched.append(entry)
+                        else:
+                            record(match)
+                            place(entry, match)
+            if unmatched:
+                for entry, match in zip(unmatched, classify_content(unmatched)):
+                    record(match)
+                    place(entry, match)
+
+        names = list(files)
+        matches = [classify(files[name], families, now) for name in names]
+        if sniff:
+            # Solo se leen los archivos que las reglas baratas no clasificaron
+            unmatched = [position for position, match in enumerate(matches) if match is None]
+            sniffed = classify_content([files[names[position]] for position in unmatched])
+            for position, match in zip(unmatched, sniffed):
+                matches[position] = match
+
+        for name, match in zip(names, matches):
+            record(match)
+            entry = files[name]
+            source = os.path.join(directory, name)
+            destination = source
+            if match:
+                destination = resolver.claim(source, os.path.join(directory, match[0], name),
+                                             entry.path)
+                if destination is None:
+                    plan.skipped += 1
+                    destination = source
+            elif source == entry.path:
+                plan.unmatched += 1
+            if destination != source:
+                plan.append(PlannedMove(source, destination, match[1]))
+            observe(entry.path, destination, match if destination != source else None)
+
+        plan[:0] = flatten_moves
+    finally:
+        if prefetcher:
+            prefetcher.close()
+    return plan
+
+def plan_files(directory, names, rules, families=RULE_PRECEDENCE, conflict="rename", stats=None):
+    """
+    Plan the classification moves for specific files of a directory.
+
+    Unlike plan_directory the directory is not listed: only the given names
+    are stat'ed and classified. Names that are gone or are not regular
+    files are ignored.
+
+    Args:
+        directory (str): Directory that contains the files.
+        names (list): File names inside directory.
+        rules (RuleSet or dict): Rules as loaded by load_rules.
+        families (tuple, optional): Rule families to apply. Defaults to all.
+        conflict (str, optional): One of CONFLICT_POLICIES. Defaults to "rename".
+        stats (RunStats, optional): Count the files examined and time each
+            rule family. Defaults to None.
+
+    Returns:
+        MovePlan: Classification moves for the files that matched a rule;
+        the others are counted in its unmatched and skipped attributes.
+    """
+    ruleset = compile_rules(rules)
+    resolver = ConflictResolver(conflict)
+    now = time.time()
+    plan = MovePlan()
+    if stats is not None:
+        stats.count("entries_scanned", len(names))
+        stats.count("stat_calls", len(names))
+    for name in names:
+        entry = FileEntry(os.path.join(directory, name))
+        if name == METADATA_DIR or not entry.is_file():
+            continue
+        if stats is None:
+            match = ruleset.classify(entry, families, now)
+        else:
+            match = ruleset.classify_timed(entry, families, now, stats)
+            stats.match(match[1] if match else None)
+        if match is None:
+            plan.unmatched += 1
+            continue
+        destination = resolver.claim(entry.path, os.path.join(directory, match[0], name))
+        if destination:
+            plan.append(PlannedMove(entry.path, destination, match[1]))
+        else:
+            plan.skipped += 1
+    return plan
@@ -0,0 +1,593 @@
+import bisect
+import json
+import logging
+import os
+import re
+import time
+from collections import deque
+from collections.abc import Mapping
+from concurrent.futures import ThreadPoolExecutor
+try:
+    from re import _parser as sre_parse
+except ImportError:  # Python < 3.11
+    import sre_parse
+
+logger = logging.getLogger(__name__)
+
+# Reglas ya compiladas, por ruta absoluta: ((mtime_ns, tamaño), RuleSet)
+_rules_cache = {}
+
+def _file_key(path):
+    st = os.stat(path)
+    return st.st_mtime_ns, st.st_size
+
+def load_rules(rules_file):
+    """
+    Load and compile rules from a JSON file with error handling.
+
+    Compiled rules are cached by path, mtime and size: while the file does
+    not change, loading it again costs one stat and returns the same
+    RuleSet, so long-running processes can call this before every batch to
+    pick up edits.
+
+    Args:
+        rules_file (str): Path to the rules file.
+
+    Returns:
+        RuleSet: The compiled rules, or an empty RuleSet if the file cannot be loaded.
+    """
+    path = os.path.abspath(rules_file)
+    try:
+        key = _file_key(path)
+        cached = _rules_cache.get(path)
+        if cached is not None and cached[0] == key:
+            return cached[1]
+        with open(path, 'r', encoding='utf-8') as f:
+            rules = json.load(f)
+        ruleset = RuleSet(rules)
+        _rules_cache[path] = (key, ruleset)
+        return ruleset
+    except (FileNotFoundError, json.JSONDecodeError, ValueError) as e:
+        logger.error(f"Error al cargar reglas: {e}")
+        # Provide a default configuration if loading fails
+        return RuleSet({
+            "endwith": {},
+            "contains": {},
+            "size_ranges": {},
+            "date_ranges": {}
+        })
+
+def save_rules(rules, rules_file):
+    """
+    Save rules to a JSON file atomically.
+
+    The rules are written to a temporary file in the same directory, synced
+    and renamed over the old file, so readers see either the old or the new
+    rules, never a partial file. The cache of load_rules is updated too.
+
+    Args:
+        rules (dict or RuleSet): Rules to save.
+        rules_file (str): Path to the rules file.
+
+    Returns:
+        RuleSet: The saved rules, compiled.
+    """
+    ruleset = compile_rules(rules)
+    path = os.path.abspath(rules_file)
+    temporary = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(temporary, 'w', encoding='utf-8') as f:
+            json.dump(ruleset.raw, f, indent=4, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporary, path)
+    except BaseException:
+        try:
+            os.unlink(temporary)
+        except OSError:
+            pass
+        raise
+    _rules_cache[path] = (_file_key(path), ruleset)
+    return ruleset
+
+# Precedencia fija de las familias de reglas: un archivo va a la carpeta de la
+# primera familia que lo reconozca, y dentro de cada familia gana la primera
+# regla en el orden del archivo de reglas.
+RULE_PRECEDENCE = ("endwith", "contains", "size_ranges", "date_ranges", "regex")
+
+class ContainsMatcher:
+    """
+    Aho-Corasick automaton over the "contains" keywords.
+
+    Every filename is scanned once, in time linear in its length, whatever
+    the number of keywords. When several keywords occur in the same name the
+    one declared first in the rules wins, as with the old per-keyword passes.
+    """
+
+    def __init__(self, keywords):
+        """
+        Build the automaton.
+
+        Args:
+            keywords (list): (content, folder) pairs in rule order.
+        """
+        self.keywords = list(keywords)
+        self._goto = [{}]
+        self._fail = [0]
+        # Índice de la primera regla que termina en cada estado (o en su cadena de fallos)
+        self._out = [None]
+        self._always = None
+
+        for index, (content, _) in enumerate(keywords):
+            if not content:
+                # Una cadena vacía está contenida en cualquier nombre
+                if self._always is None:
+                    self._always = index
+                continue
+            state = 0
+            for char in content:
+                next_state = self._goto[state].get(char)
+                if next_state is None:
+                    next_state = len(self._goto)
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append(None)
+                    self._goto[state][char] = next_state
+                state = next_state
+            if self._out[state] is None:
+                self._out[state] = index
+
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, child in self._goto[state].items():
+                queue.append(child)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[child] = self._goto[fallback].get(char, 0)
+                inherited = self._out[self._fail[child]]
+                if inherited is not None and (self._out[child] is None or inherited < self._out[child]):
+                    self._out[child] = inherited
+
+    def match(self, name):
+        """
+        Find the first rule (in rule order) whose keyword occurs in name.
+
+        Args:
+            name (str): File name to test.
+
+        Returns:
+            tuple: (content, folder) of the winning rule, or None if no keyword occurs.
+        """
+        goto, fail, out = self._goto, self._fail, self._out
+        best = self._always
+        state = 0
+        for char in name:
+            if best == 0:
+                break
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            found = out[state]
+            if found is not None and (best is None or found < best):
+                best = found
+        return None if best is None else self.keywords[best]
+
+class RegexMatcher:
+    """
+    Dispatcher that tests all the regex rules with as few match calls as possible.
+
+    Consecutive patterns are merged into one alternation of lookaheads, each
+    tagged with a named empty group, so a single match call reports the
+    first rule (in rule order) whose pattern re.search would find. Patterns
+    that cannot be merged safely (backreferences, named groups or global
+    inline flags) stay on their own, in their place in the order. Each
+    merged segment also gets a prefilter: when every pattern in it has a
+    mandatory literal, names that contain none of them skip the regex engine.
+    """
+
+    def __init__(self, rules):
+        """
+        Compile the patterns.
+
+        Args:
+            rules (list): (pattern, folder) pairs in rule order. Invalid
+                patterns are logged and skipped.
+        """
+        self.rules = []
+        for pattern, folder in rules:
+            try:
+                self.rules.append((re.compile(pattern), folder))
+            except re.error as e:
+                logger.error(f"Patrón regex inválido {pattern}: {e}")
+
+        self._segments = []
+        run = []
+        for index, (compiled, _) in enumerate(self.rules):
+            if self._combinable(compiled):
+                run.append(index)
+                continue
+            if run:
+                self._segments.append(self._segment(run))
+                run = []
+            self._segments.append((compiled, [index], None, False))
+        if run:
+            self._segments.append(self._segment(run))
+
+    @staticmethod
+    def _combinable(compiled):
+        return (
+            compiled.flags & ~re.UNICODE == 0
+            and not compiled.groupindex
+            and not re.search(r"\\[1-9]|\(\?P=|\(\?\(", compiled.pattern)
+        )
+
+    @staticmethod
+    def _required_literal(compiled):
+        # Secuencia de literales más larga en el nivel superior del patrón:
+        # todo nombre que coincida tiene que contenerla.
+        if compiled.flags & re.IGNORECASE:
+            return None
+        try:
+            parsed = sre_parse.parse(compiled.pattern)
+        except re.error:
+            return None
+        best = current = ""
+        for op, value in parsed:
+            if op == sre_parse.LITERAL:
+                current += chr(value)
+                best = max(best, current, key=len)
+            else:
+                current = ""
+        return best or None
+
+    def _segment(self, indices):
+        if len(indices) == 1:
+            compiled = self.rules[indices[0]][0]
+            regex, combined = compiled, False
+        else:
+            regex = re.compile("|".join(
+                f"(?=[\\s\\S]*?(?:{self.rules[index][0].pattern}))(?P<_r{index}>)" for index in indices
+            ))
+            combined = True
+        literals = [self._required_literal(self.rules[index][0]) for index in indices]
+        prefilter = ContainsMatcher([(literal, None) for literal in literals]) if all(literals) else None
+        return regex, indices, prefilter, combined
+
+    def match(self, name):
+        """
+        Find the first rule (in rule order) whose pattern occurs in name.
+
+        Args:
+            name (str): File name to test.
+
+        Returns:
+            tuple: (pattern, folder) of the winning rule, or None if no pattern matches.
+        """
+        for regex, indices, prefilter, combined in self._segments:
+            if prefilter is not None and prefilter.match(name) is None:
+                continue
+            if combined:
+                match = regex.match(name)
+                if match:
+                    compiled, folder = self.rules[int(match.lastgroup[2:])]
+                    return compiled.pattern, folder
+            elif regex.search(name):
+                compiled, folder = self.rules[indices[0]]
+                return compiled.pattern, folder
+        return None
+
+# Bytes leídos del principio de un archivo para reconocer su tipo
+MAGIC_BYTES = 512
+
+# (desplazamiento, firma, extensión), en el orden en que se prueban
+MAGIC_SIGNATURES = (
+    (0, b"%PDF-", ".pdf"),
+    (0, b"\x89PNG\r\n\x1a\n", ".png"),
+    (0, b"\xff\xd8\xff", ".jpg"),
+    (0, b"GIF87a", ".gif"),
+    (0, b"GIF89a", ".gif"),
+    (0, b"II*\x00", ".tiff"),
+    (0, b"MM\x00*", ".tiff"),
+    (0, b"8BPS", ".psd"),
+    (0, b"\x00\x00\x01\x00", ".ico"),
+    (0, b"PK\x03\x04", ".zip"),
+    (0, b"Rar!\x1a\x07", ".rar"),
+    (0, b"\x1f\x8b", ".gz"),
+    (257, b"ustar", ".tar"),
+    (0, b"SQLite format 3\x00", ".sqlite"),
+    (0, b"ID3", ".mp3"),
+    (0, b"OggS", ".ogg"),
+    (0, b"wOFF", ".woff"),
+    (0, b"wOF2", ".woff2"),
+    (0, b"OTTO", ".otf"),
+    (0, b"\x00\x01\x00\x00\x00", ".ttf"),
+)
+
+# Formatos que son RIFF o ZIP por dentro, según lo que aparece tras la cabecera
+RIFF_FORMATS = {b"WAVE": ".wav", b"WEBP": ".webp", b"AVI ": ".avi"}
+
+ZIP_FORMATS = ((b"word/", ".docx"), (b"xl/", ".xlsx"), (b"ppt/", ".pptx"))
+
+# Primera entrada de un documento de Office (OOXML) guardado en el orden habitual
+OOXML_FIRST_ENTRY = b"[Content_Types].xml"
+
+# Marca principal de los archivos ISO-BMFF ("ftyp" en el desplazamiento 4);
+# HEIC, AVIF y M4A comparten el contenedor con el vídeo MP4
+FTYP_BRANDS = {
+    b"isom": ".mp4", b"iso2": ".mp4", b"iso4": ".mp4", b"iso5": ".mp4", b"iso6": ".mp4",
+    b"mp41": ".mp4", b"mp42": ".mp4", b"avc1": ".mp4", b"dash": ".mp4", b"mmp4": ".mp4",
+    b"M4V ": ".m4v", b"M4VH": ".m4v", b"M4VP": ".m4v",
+    b"qt  ": ".mov",
+    b"3gp4": ".3gp", b"3gp5": ".3gp", b"3gp6": ".3gp", b"3g2a": ".3g2",
+    b"M4A ": ".m4a", b"M4B ": ".m4b",
+    b"heic": ".heic", b"heix": ".heic", b"mif1": ".heic", b"msf1": ".heic",
+    b"avif": ".avif", b"avis": ".avif",
+}
+
+def sniff_extension(path):
+    """
+    Recognize a file type from its first MAGIC_BYTES bytes.
+
+    The header is read with a single os.pread.
+
+    Args:
+        path (str): Path of the file.
+
+    Returns:
+        str: The usual extension of the detected type (e.g. ".pdf"), or None.
+    """
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        head = os.pread(fd, MAGIC_BYTES, 0)
+    finally:
+        os.close(fd)
+
+    if head[:4] == b"RIFF":
+        return RIFF_FORMATS.get(head[8:12])
+    if head[4:8] == b"ftyp":
+        return FTYP_BRANDS.get(head[8:12])
+    for offset, signature, extension in MAGIC_SIGNATURES:
+        if head.startswith(signature, offset):
+            if extension == ".zip":
+                # Nombre de la primera entrada, tras la cabecera local de 30 bytes
+                for marker, office in ZIP_FORMATS:
+                    if head.startswith(marker, 30):
+                        return office
+                # Documento de Office que empieza por la lista de tipos
+                if head.startswith(OOXML_FIRST_ENTRY, 30):
+                    return None
+            return extension
+    return None
+
+class RuleSet(Mapping):
+    """
+    Validated, compiled rules.
+
+    Everything is parsed once: extensions go to a dict, "contains" keywords
+    to a ContainsMatcher, size ranges to a sorted interval table searched
+    with bisect, date ranges to sorted ages in seconds and regex patterns to
+    a RegexMatcher. Classifying a file then only does lookups, and the same
+    RuleSet can be reused across runs (the date cutoffs are taken relative
+    to the "now" of each call) and by the GUI.
+
+    A RuleSet is also a read-only mapping over the raw rules dict, so code
+    that reads rules["endwith"] or rules.get("generate_tree") keeps working.
+    Malformed individual rules are logged and skipped.
+    """
+
+    def __init__(self, rules):
+        """
+        Compile a rules dict.
+
+        Args:
+            rules (dict): Raw rules, as stored in rules.json.
+
+        Raises:
+            ValueError: If the rules do not have the expected structure.
+        """
+        if not isinstance(rules, dict) or not all(isinstance(rules.get(key), dict) for key in ["endwith", "contains"]):
+            raise ValueError("El archivo de configuración no tiene el formato correcto")
+        for key in ["size_ranges", "date_ranges", "regex"]:
+            if not isinstance(rules.get(key, {}), dict):
+                raise ValueError(f"La sección '{key}' debe ser un objeto")
+
+        self.raw = rules
+        self.extensions = dict(rules["endwith"])
+        self.contains = ContainsMatcher(list(rules["contains"].items()))
+
+        sizes = []
+        for size_range, folder in rules.get("size_ranges", {}).items():
+            try:
+                min_size, max_size = (float(x) * 1024 * 1024 for x in size_range.split('-'))
+            except ValueError:
+                logger.error(f"Rango de tamaño inválido: {size_range}")
+                continue
+            sizes.append((min_size, max_size, folder, size_range))
+        self._build_size_table(sizes)
+
+        dates = []
+        for date_range, folder in rules.get("date_ranges", {}).items():
+            try:
+                days = int(date_range.split('-')[0])
+            except ValueError:
+                logger.error(f"Rango de fechas inválido: {date_range}")
+                continue
+            dates.append((days * 86400, folder, date_range))
+        self._build_date_table(dates)
+
+        self.regex = RegexMatcher(list(rules.get("regex", {}).items()))
+
+    def _build_size_table(self, sizes):
+        # Tabla de intervalos elementales: cada límite es un punto y entre dos
+        # límites consecutivos hay un hueco; para cada uno se guarda la primera
+        # regla (en orden del archivo) que lo cubre.
+        self._size_points = sorted({bound for rule in sizes for bound in rule[:2]})
+        points = self._size_points
+
+        def first_covering(low, high):
+            for min_size, max_size, folder, key in sizes:
+                if min_size <= low and high <= max_size:
+                    return folder, key
+            return None
+
+        self._size_at_point = [first_covering(p, p) for p in points]
+        self._size_in_gap = [None] + [
+            first_covering(points[i - 1], points[i]) for i in range(1, len(points))
+        ] + [None]
+
+    def _build_date_table(self, dates):
+        # Una regla de N días acepta los archivos con antigüedad <= N días; se
+        # ordenan por antigüedad y se guarda el ganador de cada sufijo.
+        ordered = sorted(range(len(dates)), key=lambda i: dates[i][0])
+        self._date_ages = [dates[i][0] for i in ordered]
+        self._date_winner = [None] * len(ordered)
+        best = None
+        for position in range(len(ordered) - 1, -1, -1):
+            index = ordered[position]
+            if best is None or index < best:
+                best = index
+            self._date_winner[position] = dates[best][1:]
+
+    def match_size(self, size):
+        """Return (folder, key) of the first size range containing size, or None."""
+        points = self._size_points
+        position = bisect.bisect_left(points, size)
+        if position < len(points) and points[position] == size:
+            return self._size_at_point[position]
+        return self._size_in_gap[position]
+
+    def match_date(self, mtime, now):
+        """Return (folder, key) of the first date range that mtime falls in, or None."""
+        position = bisect.bisect_left(self._date_ages, now - mtime)
+        if position < len(self._date_winner):
+            return self._date_winner[position]
+        return None
+
+    def classify(self, entry, families=RULE_PRECEDENCE, now=None):
+        """
+        Work out the destination folder for a file.
+
+        Families are tried in RULE_PRECEDENCE order; the file is only stat'ed
+        (through the DirEntry cache) once a size or date rule needs it.
+
+        Args:
+            entry (os.DirEntry): Directory entry of the file (or a FileEntry).
+            families (tuple, optional): Rule families to apply. Defaults to all.
+            now (float, optional): Reference epoch time for date ranges.
+                Defaults to the current time.
+
+        Returns:
+            tuple: (folder, rule) where rule is "family:key" (e.g. "endwith:.pdf"),
+            or None if no rule matches.
+        """
+        name = entry.name
+        for family in RULE_PRECEDENCE:
+            if family not in families:
+                continue
+            if family == "endwith":
+                extension = os.path.splitext(name)[1]
+                folder = self.extensions.get(extension)
+                if folder:
+                    return folder, f"{family}:{extension}"
+            elif family == "contains":
+                match = self.contains.match(name)
+                if match:
+                    return match[1], f"{family}:{match[0]}"
+            elif family == "size_ranges":
+                match = self._size_points and self.match_size(entry.stat().st_size)
+                if match:
+                    return match[0], f"{family}:{match[1]}"
+            elif family == "date_ranges":
+                if self._date_ages:
+                    match = self.match_date(entry.stat().st_mtime, time.time() if now is None else now)
+                    if match:
+                        return match[0], f"{family}:{match[1]}"
+            elif family == "regex":
+                match = self.regex.match(name)
+                if match:
+                    return match[1], f"{family}:{match[0]}"
+        return None
+
+    def classify_timed(self, entry, families, now, stats):
+        """
+        Like classify, but record the time spent in each family in stats.
+
+        Also counts in stats.counters["stat_calls"] the files that a size
+        or date rule asked to stat.
+
+        Args:
+            entry (os.DirEntry): Directory entry of the file (or a FileEntry).
+            families (tuple): Rule families to apply.
+            now (float): Reference epoch time for date ranges, or None.
+            stats (RunStats): Where to record the timings.
+
+        Returns:
+            tuple: (folder, rule) as returned by classify, or None.
+        """
+        match = None
+        stat = False
+        for family in RULE_PRECEDENCE:
+            if family not in families:
+                continue
+            start = time.perf_counter()
+            match = self.classify(entry, (family,), now)
+            stats.family_time(family, time.perf_counter() - start)
+            stat = stat or (family == "size_ranges" and bool(self._size_points)) or \
+                (family == "date_ranges" and bool(self._date_ages))
+            if match:
+                break
+        if stat:
+            stats.count("stat_calls")
+        return match
+
+    def classify_content(self, paths, workers=4):
+        """
+        Classify files by their content, for files no other rule matched.
+
+        Each file's type is recognized from its first bytes (see
+        sniff_extension) and sent to the folder of the "endwith" rule for
+        that extension. The reads run on a thread pool.
+
+        Args:
+            paths (list): Paths of the files.
+            workers (int, optional): Threads reading the files. Defaults to 4.
+
+        Returns:
+            list: (folder, "magic:<extension>") or None for every path, in order.
+        """
+        def sniff(path):
+            try:
+                extension = sniff_extension(path)
+            except OSError as e:
+                logger.error(f"Error al leer archivo {os.path.basename(path)}: {e}")
+                return None
+            folder = self.extensions.get(extension)
+            return (folder, f"magic:{extension}") if folder else None
+
+        if workers <= 1 or len(paths) < 2:
+            return [sniff(path) for path in paths]
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            return list(pool.map(sniff, paths))
+
+    def __getitem__(self, key):
+        return self.raw[key]
+
+    def __iter__(self):
+        return iter(self.raw)
+
+    def __len__(self):
+        return len(self.raw)
+
+def compile_rules(rules):
+    """
+    Return rules as a RuleSet, compiling them only if needed.
+
+    Args:
+        rules (dict or RuleSet): Raw rules or an already compiled RuleSet.
+
+    Returns:
+        RuleSet: The compiled rules.
+    """
+    return rules if isinstance(rules, RuleSet) else RuleSet(rules)
@@ -0,0 +1,175 @@
+import contextlib
+import errno
+import io
+import json
+import os
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+STATS_FORMATS = ("text", "json")
+
+def measure(stats, name):
+    """Return stats.stage(name), or a context that does nothing when stats is None."""
+    return stats.stage(name) if stats is not None else contextlib.nullcontext()
+
+class RunStats:
+    """
+    Counters and timers of an organize run, by stage and by rule family.
+
+    Pass one to plan_directory, plan_files and apply_plan (or to the api
+    functions) and wrap each stage in stage(); nothing is counted when no
+    RunStats is given. Updates from the move threads are locked.
+
+    Counters: entries_scanned, directories_scanned, stat_calls (metadata
+    requests for size and date rules, index lookups and watched names; a
+    DirEntry answers repeated ones from its cache), bytes_copied and
+    unmatched. Matches are kept per rule ("endwith:.pdf") and per family,
+    with the time spent in each family; moves by kind ("rename", "copy",
+    "link") and errors by errno name.
+
+    Args:
+        profile (bool, optional): Run each stage under cProfile and keep the
+            profile. Defaults to False.
+    """
+
+    def __init__(self, profile=False):
+        self.profile = profile
+        self.counters = Counter()
+        self.matches = Counter()
+        self.family_matches = Counter()
+        self.family_seconds = Counter()
+        self.moves = Counter()
+        self.errors = Counter()
+        self.stages = Counter()
+        self.profiles = {}
+        self._lock = threading.Lock()
+        self._profiling = False
+
+    @contextmanager
+    def stage(self, name):
+        """
+        Time a stage and, when profiling, run it under cProfile.
+
+        Repeated stages add up. A stage nested in another one is timed but
+        not profiled on its own: its calls already show in the outer profile.
+        """
+        profiler = None
+        if self.profile and not self._profiling:
+            # cProfile solo se carga si se perfila de verdad
+            import cProfile
+            profiler = self.profiles.setdefault(name, cProfile.Profile())
+            self._profiling = True
+            profiler.enable()
+        start = time.perf_counter()
+        try:
+            yield self
+        finally:
+            self.stages[name] += time.perf_counter() - start
+            if profiler is not None:
+                profiler.disable()
+                self._profiling = False
+
+    def count(self, name, n=1):
+        """Add n to one of the counters."""
+        with self._lock:
+            self.counters[name] += n
+
+    def family_time(self, family, seconds):
+        """Add the time spent trying one rule family."""
+        self.family_seconds[family] += seconds
+
+    def match(self, rule):
+        """Record a classification; rule is "family:key", or None if no rule matched."""
+        if rule is None:
+            self.counters["unmatched"] += 1
+            return
+        self.matches[rule] += 1
+        self.family_matches[rule.split(":", 1)[0]] += 1
+
+    def moved(self, kind, size=0):
+        """Record a move done by kind ("rename", "copy" or "link"), with the bytes copied."""
+        with self._lock:
+            self.moves[kind] += 1
+            if size:
+                self.counters["bytes_copied"] += size
+
+    def error(self, error):
+        """Record a failed operation by the name of its errno."""
+        code = getattr(error, "errno", None)
+        name = errno.errorcode.get(code, str(code)) if code is not None else type(error).__name__
+        with self._lock:
+            self.errors[name] += 1
+
+    def as_dict(self):
+        """Return every counter and timer as plain, JSON-serializable data."""
+        return {
+            "stages": {name: round(seconds, 6) for name, seconds in self.stages.items()},
+            "counters": dict(self.counters),
+            "families": {
+                family: {"matches": self.family_matches[family],
+                         "seconds": round(self.family_seconds[family], 6)}
+                for family in sorted(set(self.family_seconds) | set(self.family_matches))
+            },
+            "matches": dict(self.matches.most_common()),
+            "moves": dict(self.moves),
+            "errors": dict(self.errors),
+        }
+
+    def report(self, output_format="text", top=10):
+        """
+        Format the statistics.
+
+        Args:
+            output_format (str, optional): One of STATS_FORMATS. Defaults to "text".
+            top (int, optional): Rules, and functions of each profile, to
+                list in the text report. Defaults to 10.
+
+        Returns:
+            str: The report.
+        """
+        if output_format == "json":
+            return json.dumps(self.as_dict(), indent=2, ensure_ascii=False)
+        lines = ["Etapas:"]
+        lines += [f"  {name:<12} {seconds:10.4f} s" for name, seconds in self.stages.items()]
+        lines.append("Contadores:")
+        lines += [f"  {name:<20} {value}" for name, value in sorted(self.counters.items())]
+        if self.family_seconds or self.family_matches:
+            lines.append("Familias de reglas:")
+            for family in sorted(set(self.family_seconds) | set(self.family_matches),
+                                 key=lambda family: -self.family_seconds[family]):
+                lines.append(f"  {family:<12} {self.family_matches[family]:>8} coincidencias "
+                             f"{self.family_seconds[family]:10.4f} s")
+        if self.matches:
+            lines.append(f"Reglas más usadas (de {len(self.matches)}):")
+            lines += [f"  {rule:<30} {n}" for rule, n in self.matches.most_common(top)]
+        if self.moves:
+            lines.append("Movimientos: " + ", ".join(f"{kind} {n}" for kind, n in sorted(self.moves.items())))
+        if self.errors:
+            lines.append("Errores: " + ", ".join(f"{name} {n}" for name, n in self.errors.most_common()))
+        if self.profiles:
+            import pstats
+        for name, profiler in self.profiles.items():
+            stream = io.StringIO()
+            pstats.Stats(profiler, stream=stream).sort_stats("cumulative").print_stats(top)
+            lines.append(f"Perfil de {name}:")
+            lines.append(stream.getvalue().strip("\n"))
+        return "\n".join(lines)
+
+    def dump_profiles(self, directory):
+        """
+        Save the profile of each stage as <directory>/<stage>.prof.
+
+        The files can be loaded with pstats or any cProfile viewer.
+
+        Returns:
+            list: Paths of the files written.
+        """
+        os.makedirs(directory, exist_ok=True)
+        paths = []
+        for name, profiler in self.profiles.items():
+            path = os.path.join(directory, f"{name}.prof")
+            profiler.dump_stats(path)
+            paths.append(path)
+        return paths
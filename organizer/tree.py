@@ -0,0 +1,279 @@
+import datetime
+import json
+import logging
+import os
+import sys
+
+from .walk import ScandirPrefetcher, _list_dir
+
+logger = logging.getLogger(__name__)
+
+def _tree_listing(path, prefix, depth, listdir=_list_dir):
+    # Hijos de un directorio para iter_tree: carpetas primero y luego archivos,
+    # ordenados por nombre. Devuelve (marco, None) o (None, línea de error).
+    try:
+        entries = sorted(listdir(path), key=lambda entry: entry.name)
+    except PermissionError:
+        return None, prefix + "[Acceso denegado]\n"
+    except OSError as e:
+        return None, prefix + f"[Error: {e}]\n"
+    folders = [entry for entry in entries if entry.is_dir()]
+    files = [entry for entry in entries if entry.is_file() and not entry.is_dir()]
+    return [folders + files, 0, prefix, depth], None
+
+def iter_tree(directory, max_depth=None, workers=1):
+    """
+    Yield the lines of a directory tree drawing, one at a time.
+
+    The tree is walked with os.scandir and an explicit stack instead of
+    recursion, so deep trees do not hit the recursion limit and memory is
+    bounded by the depth times the widest directory. Each entry is stat'ed
+    at most once, through the DirEntry cache. Symlinked directories are
+    shown but not expanded.
+
+    Args:
+        directory (str): Path to the directory to generate tree for
+        max_depth (int, optional): Deepest directory level whose contents are
+            listed (the root is level 0). Defaults to None (no limit).
+        workers (int, optional): Threads listing upcoming directories in
+            parallel (see ScandirPrefetcher); the output is the same. Defaults to 1.
+
+    Yields:
+        str: Lines of the drawing, each ending in a newline.
+    """
+    root = os.path.normpath(directory)
+    yield "└── " + os.path.basename(root) + "\n"
+    if max_depth is not None and max_depth < 0:
+        return
+
+    prefetcher = ScandirPrefetcher(workers) if workers > 1 else None
+    listdir = prefetcher.listdir if prefetcher else _list_dir
+
+    def expand(frame):
+        # Pedir por adelantado las carpetas del marco que se van a desplegar
+        if prefetcher and (max_depth is None or frame[3] < max_depth):
+            prefetcher.prefetch(
+                entry.path for entry in frame[0] if entry.is_dir() and not entry.is_symlink()
+            )
+        return frame
+
+    try:
+        yield from _iter_tree_frames(root, max_depth, listdir, expand)
+    finally:
+        if prefetcher:
+            prefetcher.close()
+
+def _iter_tree_frames(root, max_depth, listdir, expand):
+    frame, error = _tree_listing(root, "    ", 0, listdir)
+    if error:
+        yield error
+        return
+    stack = [expand(frame)]
+    while stack:
+        frame = stack[-1]
+        children, position, prefix, depth = frame
+        if position == len(children):
+            stack.pop()
+            continue
+        entry = children[position]
+        frame[1] = position = position + 1
+        is_last = position == len(children)
+        yield prefix + ("└── " if is_last else "├── ") + entry.name + "\n"
+
+        if entry.is_dir() and not entry.is_symlink() and (max_depth is None or depth < max_depth):
+            child, error = _tree_listing(entry.path, prefix + ("    " if is_last else "│   "), depth + 1, listdir)
+            if error:
+                yield error
+            else:
+                stack.append(expand(child))
+
+def _stats_frame(path, relative, depth, listdir=_list_dir):
+    # Marco de iter_tree_stats: lista el directorio una sola vez y acumula
+    # los archivos propios; los subdirectorios se visitan después.
+    frame = {
+        "path": relative, "depth": depth, "files": 0, "bytes": 0, "dirs": 0,
+        "total_files": 0, "total_bytes": 0, "newest_mtime": None, "subdirs": [],
+    }
+    try:
+        entries = sorted(listdir(path), key=lambda entry: entry.name)
+    except OSError as e:
+        frame["error"] = str(e)
+        return frame
+    for entry in entries:
+        try:
+            if entry.is_dir(follow_symlinks=False):
+                frame["subdirs"].append(entry)
+            elif entry.is_file(follow_symlinks=False):
+                st = entry.stat(follow_symlinks=False)
+                frame["files"] += 1
+                frame["bytes"] += st.st_size
+                if frame["newest_mtime"] is None or st.st_mtime > frame["newest_mtime"]:
+                    frame["newest_mtime"] = st.st_mtime
+        except OSError:
+            continue
+    frame["dirs"] = len(frame["subdirs"])
+    frame["total_files"] = frame["files"]
+    frame["total_bytes"] = frame["bytes"]
+    frame["subdirs"].reverse()
+    return frame
+
+def iter_tree_stats(directory, max_depth=None, workers=1):
+    """
+    Yield per-directory statistics of a tree, aggregated bottom-up in one walk.
+
+    Every directory is listed once with os.scandir. Each record carries the
+    direct file count and bytes and the totals and newest file mtime of its
+    whole subtree. Symlinks are not followed. max_depth only limits which
+    records are yielded; the totals always cover the full tree.
+
+    Args:
+        directory (str): Path to the directory to analyze
+        max_depth (int, optional): Deepest level yielded (the root is level 0).
+            Defaults to None (no limit).
+        workers (int, optional): Threads listing and stat'ing upcoming
+            directories in parallel (see ScandirPrefetcher). Defaults to 1.
+
+    Yields:
+        dict: One record per directory, in post-order (children before their
+        parent), with keys path (relative, "." for the root), depth, files,
+        bytes, dirs, total_files, total_bytes, newest_mtime and, if the
+        directory could not be read, error.
+    """
+    prefetcher = ScandirPrefetcher(workers, stat=True, follow_symlinks=False) if workers > 1 else None
+    listdir = prefetcher.listdir if prefetcher else _list_dir
+
+    def visit(path, relative, depth):
+        frame = _stats_frame(path, relative, depth, listdir)
+        if prefetcher:
+            prefetcher.prefetch(entry.path for entry in reversed(frame["subdirs"]))
+        return frame
+
+    try:
+        yield from _iter_stats_frames(os.path.normpath(directory), max_depth, visit)
+    finally:
+        if prefetcher:
+            prefetcher.close()
+
+def _iter_stats_frames(root, max_depth, visit):
+    stack = [(root, visit(root, ".", 0))]
+    while stack:
+        path, frame = stack[-1]
+        if frame["subdirs"]:
+            entry = frame["subdirs"].pop()
+            relative = entry.name if frame["path"] == "." else frame["path"] + "/" + entry.name
+            stack.append((entry.path, visit(entry.path, relative, frame["depth"] + 1)))
+            continue
+
+        stack.pop()
+        del frame["subdirs"]
+        if stack:
+            parent = stack[-1][1]
+            parent["total_files"] += frame["total_files"]
+            parent["total_bytes"] += frame["total_bytes"]
+            if frame["newest_mtime"] is not None and (
+                parent["newest_mtime"] is None or frame["newest_mtime"] > parent["newest_mtime"]
+            ):
+                parent["newest_mtime"] = frame["newest_mtime"]
+        if max_depth is None or frame["depth"] <= max_depth:
+            yield frame
+
+def tree_stats(directory, max_depth=None, workers=1):
+    """
+    Build the nested statistics of a tree, for JSON export.
+
+    Args:
+        directory (str): Path to the directory to analyze
+        max_depth (int, optional): Deepest level included. Defaults to None.
+        workers (int, optional): Parallel listing threads. Defaults to 1.
+
+    Returns:
+        dict: Record of the root (see iter_tree_stats) with a "children" list
+        of the records of its subdirectories, recursively.
+    """
+    children = {}
+    record = None
+    for record in iter_tree_stats(directory, max_depth=max_depth, workers=workers):
+        record["children"] = children.pop(record["path"], [])
+        if record["path"] != ".":
+            parent = record["path"].rpartition("/")[0] or "."
+            children.setdefault(parent, []).append(record)
+    return record
+
+def generate_tree(directory, max_depth=None):
+    """
+    Generate a directory tree representation.
+
+    Prefer iter_tree or save_tree for large trees: this builds the whole
+    drawing in memory.
+
+    Args:
+        directory (str): Path to the directory to generate tree for
+        max_depth (int, optional): Maximum depth to traverse. Defaults to None.
+
+    Returns:
+        str: Formatted directory tree as a string
+    """
+    return "".join(iter_tree(directory, max_depth=max_depth))
+
+TREE_FORMATS = ("text", "json", "ndjson")
+
+def write_tree(f, directory, max_depth=None, output_format="text", workers=1):
+    """
+    Write the directory tree to an open text stream.
+
+    "text" writes the drawing of iter_tree, "ndjson" one iter_tree_stats
+    record per line (children before their parent) and "json" the nested
+    result of tree_stats.
+
+    Args:
+        f (file): Text stream to write to.
+        directory (str): Path to the directory to generate tree for.
+        max_depth (int, optional): Maximum depth to output. Defaults to None.
+        output_format (str, optional): One of TREE_FORMATS. Defaults to "text".
+        workers (int, optional): Parallel listing threads. Defaults to 1.
+    """
+    if output_format not in TREE_FORMATS:
+        raise ValueError(f"Formato de árbol desconocido: {output_format}")
+    if output_format == "text":
+        f.writelines(iter_tree(directory, max_depth=max_depth, workers=workers))
+    elif output_format == "ndjson":
+        for record in iter_tree_stats(directory, max_depth=max_depth, workers=workers):
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+    else:
+        json.dump(tree_stats(directory, max_depth=max_depth, workers=workers), f, indent=2, ensure_ascii=False)
+        f.write("\n")
+
+def save_tree(directory, output_file, max_depth=None, output_format="text", workers=1):
+    """
+    Save the directory tree to a file, streaming it where the format allows.
+
+    See write_tree for the formats; "text" files also get a header with the
+    generation date.
+    
+    Args:
+        directory (str): Path to the directory to generate tree for
+        output_file (str): Path to the output file, or "-" for stdout
+        max_depth (int, optional): Maximum depth to output. Defaults to None.
+        output_format (str, optional): One of TREE_FORMATS. Defaults to "text".
+        workers (int, optional): Parallel listing threads. Defaults to 1.
+    """
+    try:
+        if output_format not in TREE_FORMATS:
+            raise ValueError(f"Formato de árbol desconocido: {output_format}")
+        if output_file == "-":
+            f = sys.stdout
+        else:
+            f = open(output_file, 'w', encoding='utf-8')
+        try:
+            if output_format == "text":
+                f.write(f"Árbol de Directorios generado el: {datetime.datetime.now()}\n")
+                f.write("=" * 50 + "\n")
+            write_tree(f, directory, max_depth, output_format, workers)
+        finally:
+            if f is not sys.stdout:
+                f.close()
+
+        if output_file != "-":
+            logger.info(f"Árbol de directorios guardado en: {output_file}")
+    except Exception as e:
+        logger.error(f"Error al guardar el árbol de directorios: {e}")
@@ -0,0 +1,178 @@
+import fnmatch
+import logging
+import os
+import stat
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from .index import METADATA_DIR
+
+logger = logging.getLogger(__name__)
+
+def _list_dir(path, stat=False, follow_symlinks=True):
+    with os.scandir(path) as it:
+        entries = list(it)
+    if stat:
+        # Rellenar la caché de stat de cada DirEntry mientras seguimos en el hilo trabajador
+        for entry in entries:
+            try:
+                entry.stat(follow_symlinks=follow_symlinks)
+            except OSError:
+                pass
+    return entries
+
+class ScandirPrefetcher:
+    """
+    Lists directories ahead of a sequential walk on a thread pool.
+
+    On network filesystems every listing is a round trip, but scandir and
+    stat release the GIL. The walkers keep visiting directories in their
+    usual order and only hand upcoming directories to prefetch(), so the
+    output order does not change. listdir() then returns the listing that
+    is already done, or lists the directory right away if it was never
+    prefetched. At most max_pending listings are in flight or waiting to be
+    consumed; the other upcoming directories wait in a queue and are
+    submitted as listdir() frees slots. Directories handed over later go
+    ahead of the earlier ones, since a depth-first walk visits them first.
+    """
+
+    def __init__(self, workers, stat=False, follow_symlinks=True, max_pending=None):
+        """
+        Args:
+            workers (int): Number of listing threads.
+            stat (bool, optional): Also stat every entry in the worker, filling
+                the DirEntry cache. Defaults to False.
+            follow_symlinks (bool, optional): Stat mode used with stat. Defaults to True.
+            max_pending (int, optional): Queue limit. Defaults to 64 per worker.
+        """
+        self.pool = ThreadPoolExecutor(max_workers=workers)
+        self.stat = stat
+        self.follow_symlinks = follow_symlinks
+        self.max_pending = max_pending or workers * 64
+        self.pending = {}
+        # Directorios por listar que aún no caben en la ventana
+        self.upcoming = deque()
+        self.queued = set()
+
+    def _fill(self):
+        while len(self.pending) < self.max_pending and self.upcoming:
+            path = self.upcoming.popleft()
+            if path in self.queued:
+                self.queued.discard(path)
+                self.pending[path] = self.pool.submit(_list_dir, path, self.stat, self.follow_symlinks)
+
+    def prefetch(self, paths):
+        """Queue the listing of directories that the walk will visit soon, in visit order."""
+        paths = [path for path in paths if path not in self.pending and path not in self.queued]
+        self.queued.update(paths)
+        self.upcoming.extendleft(reversed(paths))
+        self._fill()
+
+    def listdir(self, path):
+        """Return the DirEntry objects of a directory, using the prefetched listing if any."""
+        future = self.pending.pop(path, None)
+        if future is None:
+            # Listado ahora mismo: ya no hace falta pedirlo por adelantado
+            self.queued.discard(path)
+            entries = _list_dir(path, self.stat, self.follow_symlinks)
+        else:
+            entries = future.result()
+        self._fill()
+        return entries
+
+    def close(self):
+        self.pool.shutdown(wait=True, cancel_futures=True)
+        self.pending.clear()
+        self.upcoming.clear()
+        self.queued.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+def _is_excluded(path, root, patterns):
+    if not patterns:
+        return False
+    name = os.path.basename(path)
+    relative = os.path.relpath(path, root).replace(os.sep, "/")
+    return any(fnmatch.fnmatch(name, p) or fnmatch.fnmatch(relative, p) for p in patterns)
+
+def walk_tree(top, max_depth=None, exclude=(), root=None, prefetcher=None):
+    """
+    Stream the files of a directory tree, one directory at a time.
+
+    The walk uses os.scandir and an explicit stack, so memory stays bounded
+    by the depth times the widest directory and the file type and stat data
+    cached on each DirEntry are reused. Symlinked directories are not
+    followed, and METADATA_DIR is always skipped.
+
+    Args:
+        top (str): Directory to walk.
+        max_depth (int, optional): Levels of subdirectories below top to
+            descend into; None for no limit. Defaults to None.
+        exclude (tuple, optional): Glob patterns matched against entry names
+            and against paths relative to root. Defaults to ().
+        root (str, optional): Base for relative exclude paths. Defaults to top.
+        prefetcher (ScandirPrefetcher, optional): List upcoming directories
+            in parallel. Defaults to None (sequential).
+
+    Yields:
+        tuple: (dirpath, files) with the DirEntry objects of the regular files
+        directly inside dirpath, in pre-order.
+    """
+    root = root or top
+    stack = [(top, 0)]
+    while stack:
+        path, depth = stack.pop()
+        try:
+            entries = prefetcher.listdir(path) if prefetcher else _list_dir(path)
+        except OSError as e:
+            logger.error(f"Error al leer directorio {path}: {e}")
+            continue
+
+        files = []
+        subdirectories = []
+        for entry in entries:
+            if entry.name == METADATA_DIR or _is_excluded(entry.path, root, exclude):
+                continue
+            if entry.is_dir(follow_symlinks=False):
+                if max_depth is None or depth < max_depth:
+                    subdirectories.append(entry.path)
+            elif entry.is_file():
+                files.append(entry)
+
+        if prefetcher:
+            prefetcher.prefetch(subdirectories)
+        yield path, files
+        stack.extend((subdirectory, depth + 1) for subdirectory in reversed(subdirectories))
+
+class FileEntry:
+    """
+    Minimal os.DirEntry stand-in for a file known only by its path.
+
+    Lets RuleSet.classify work on names reported by a watcher without listing
+    the whole directory; stat() is cached like DirEntry's.
+    """
+
+    __slots__ = ("path", "name", "_stat")
+
+    def __init__(self, path):
+        self.path = path
+        self.name = os.path.basename(path)
+        self._stat = None
+
+    def stat(self):
+        if self._stat is None:
+            self._stat = os.stat(self.path)
+        return self._stat
+
+    def inode(self):
+        return self.stat().st_ino
+
+    def is_file(self):
+        try:
+            return stat.S_ISREG(self.stat().st_mode)
+        except OSError:
+            return False
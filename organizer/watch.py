@@ -0,0 +1,121 @@
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import time
+
+class InotifyWatcher:
+    """
+    Report the files that finish arriving in a directory, using Linux inotify.
+
+    Only IN_CLOSE_WRITE and IN_MOVED_TO are watched, so a file is reported
+    once its writer closes it (or it is moved in whole), never while it is
+    still being written. inotify is reached through ctypes; OSError is
+    raised when it is not available.
+    """
+
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_TO = 0x00000080
+    IN_Q_OVERFLOW = 0x00004000
+    IN_ISDIR = 0x40000000
+    _EVENT = struct.Struct("iIII")
+
+    def __init__(self, directory):
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        if not hasattr(libc, "inotify_init1"):
+            raise OSError("inotify no está disponible en este sistema")
+        self.fd = libc.inotify_init1(os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1")
+        if libc.inotify_add_watch(self.fd, os.fsencode(directory), self.IN_CLOSE_WRITE | self.IN_MOVED_TO) < 0:
+            error = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(error, f"inotify_add_watch: {directory}")
+
+    def poll(self, timeout):
+        """
+        Wait for events.
+
+        Args:
+            timeout (float): Maximum seconds to wait.
+
+        Returns:
+            list: Names of the files that became ready, or None if the kernel
+            queue overflowed and the directory must be rescanned.
+        """
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return []
+        data = os.read(self.fd, 64 * 1024)
+        names = []
+        offset = 0
+        while offset < len(data):
+            _, mask, _, length = self._EVENT.unpack_from(data, offset)
+            offset += self._EVENT.size
+            name = data[offset:offset + length].rstrip(b"\0")
+            offset += length
+            if mask & self.IN_Q_OVERFLOW:
+                return None
+            if name and not mask & self.IN_ISDIR:
+                names.append(os.fsdecode(name))
+        return names
+
+    def close(self):
+        os.close(self.fd)
+
+class PollingWatcher:
+    """
+    Fallback watcher that lists a directory periodically.
+
+    A file is reported once its size and mtime are the same in two
+    consecutive polls, which skips files that are still being written.
+    Only the files still in the directory are remembered as reported, so a
+    file delivered again under the same name is reported again.
+    """
+
+    def __init__(self, directory, interval=1.0):
+        self.directory = directory
+        self.interval = interval
+        self._previous = self._snapshot()
+        # Los archivos ya presentes al empezar los procesa la pasada inicial
+        self._reported = dict(self._previous)
+
+    def _snapshot(self):
+        snapshot = {}
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                try:
+                    if entry.is_file():
+                        st = entry.stat()
+                        snapshot[entry.name] = (st.st_size, st.st_mtime_ns, entry.inode())
+                except OSError:
+                    continue
+        return snapshot
+
+    def poll(self, timeout):
+        """
+        Sleep and compare the directory with the previous poll.
+
+        Args:
+            timeout (float): Seconds to wait; never less than the poll interval.
+
+        Returns:
+            list: Names of the files that are new or changed and stable.
+        """
+        time.sleep(max(timeout, self.interval))
+        current = self._snapshot()
+        names = [
+            name for name, signature in current.items()
+            if self._previous.get(name) == signature and self._reported.get(name) != signature
+        ]
+        # Olvidar los archivos que ya no están (movidos o borrados)
+        self._reported = {name: signature for name, signature in self._reported.items()
+                          if name in current}
+        for name in names:
+            self._reported[name] = current[name]
+        self._previous = current
+        return names
+
+    def close(self):
+        pass
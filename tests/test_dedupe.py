@@ -0,0 +1,49 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from organizer import apply_plan, dedupe_plan, plan_directory
+
+
+class DedupeTest(unittest.TestCase):
+
+    RULES = {"endwith": {".txt": "docs"}, "contains": {}}
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def path(self, *parts):
+        return os.path.join(self.directory, *parts)
+
+    def write(self, *parts, content="mismo contenido"):
+        os.makedirs(os.path.dirname(self.path(*parts)), exist_ok=True)
+        with open(self.path(*parts), "w") as f:
+            f.write(content)
+
+    def organize(self, mode):
+        self.write("docs", "kept.txt")
+        self.write("sub", "b.txt")
+        self.write("a.txt")
+        kept = os.stat(self.path("docs", "kept.txt")).st_ino
+        plan = dedupe_plan(plan_directory(self.directory, self.RULES), self.directory, mode)
+        apply_plan(plan)
+        self.assertEqual(plan.duplicates, 2)
+        self.assertEqual(os.stat(self.path("docs", "kept.txt")).st_ino, kept)
+        return plan
+
+    def test_move_keeps_the_file_already_in_its_rule_folder(self):
+        self.organize("move")
+        self.assertEqual(sorted(os.listdir(self.path("docs"))), ["kept.txt"])
+        self.assertEqual(sorted(os.listdir(self.path("duplicates"))), ["a.txt", "b.txt"])
+
+    def test_link_never_rewrites_the_file_already_in_place(self):
+        self.organize("link")
+        kept = os.stat(self.path("docs", "kept.txt"))
+        self.assertEqual(os.stat(self.path("docs", "a.txt")).st_ino, kept.st_ino)
+        self.assertEqual(os.stat(self.path("docs", "b.txt")).st_ino, kept.st_ino)
+
+
+if __name__ == "__main__":
+    unittest.main()
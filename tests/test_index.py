@@ -0,0 +1,50 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from organizer import MetadataIndex, apply_plan, plan_directory
+
+
+class IndexTest(unittest.TestCase):
+
+    RULES = {"endwith": {".pdf": "docs"}, "contains": {}}
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def path(self, *parts):
+        return os.path.join(self.directory, *parts)
+
+    def organize(self):
+        index = MetadataIndex(self.directory)
+        try:
+            plan = plan_directory(self.directory, self.RULES, index=index)
+            apply_plan(plan)
+            index.commit()
+        finally:
+            index.close()
+        return plan
+
+    def test_failed_move_out_of_the_root_is_retried(self):
+        os.mkdir(self.path("old"))
+        for name in ("x.pdf", "docs"):
+            with open(self.path(name), "w") as f:
+                f.write(name)
+        self.organize()
+        self.assertTrue(os.path.exists(self.path("x.pdf")))
+
+        os.remove(self.path("docs"))
+        self.assertEqual(len(self.organize()), 1)
+        self.assertTrue(os.path.exists(self.path("docs", "x.pdf")))
+
+    def test_unchanged_tree_plans_nothing(self):
+        with open(self.path("x.pdf"), "w") as f:
+            f.write("x")
+        self.organize()
+        self.assertEqual(len(self.organize()), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
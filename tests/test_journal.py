@@ -0,0 +1,107 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from organizer import (MoveJournal, PlannedMove, apply_plan, incomplete_runs, iter_apply_plan,
+                       prune_journals, read_journal, recover_runs, undo_run)
+from organizer.journal import DONE_SUFFIX, JOURNAL_DIR
+
+
+class JournalTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def path(self, *parts):
+        return os.path.join(self.directory, *parts)
+
+    def touch(self, name, content=""):
+        with open(self.path(name), "w") as f:
+            f.write(content or name)
+        return self.path(name)
+
+    def plan_into(self, folder, *names):
+        os.makedirs(self.path(folder), exist_ok=True)
+        return [PlannedMove(self.touch(name), self.path(folder, name), "endwith:.txt")
+                for name in names]
+
+    def journal_names(self):
+        return sorted(os.listdir(self.path(JOURNAL_DIR)))
+
+    def test_runs_in_the_same_second_get_their_own_journal(self):
+        with mock.patch("time.strftime", return_value="20260101T000000"):
+            with MoveJournal(self.directory) as first:
+                apply_plan(self.plan_into("a", "one.txt"), journal=first)
+            with MoveJournal(self.directory) as second:
+                apply_plan(self.plan_into("b", "two.txt"), journal=second)
+
+        self.assertNotEqual(first.run_id, second.run_id)
+        self.assertEqual(len(read_journal(self.directory, second.run_id)[0]), 1)
+
+        undo_run(self.directory, second.run_id)
+        self.assertTrue(os.path.exists(self.path("two.txt")))
+        self.assertTrue(os.path.exists(self.path("a", "one.txt")))
+        undo_run(self.directory, first.run_id)
+        self.assertTrue(os.path.exists(self.path("one.txt")))
+
+    def test_new_journal_never_appends_to_an_existing_one(self):
+        with mock.patch("organizer.journal.new_run_id", return_value="20260101T000000-000000-0"):
+            MoveJournal(self.directory).close()
+            with self.assertRaises(FileExistsError):
+                MoveJournal(self.directory)
+
+    def test_finished_journals_are_renamed_and_crashed_ones_listed(self):
+        with MoveJournal(self.directory) as finished:
+            apply_plan(self.plan_into("a", "one.txt"), journal=finished)
+        self.assertTrue(finished.path.endswith(DONE_SUFFIX))
+
+        journal = MoveJournal(self.directory)
+        batches = iter_apply_plan(self.plan_into("b", "two.txt", "three.txt"), journal=journal,
+                                  batch_size=1)
+        next(batches)
+        with self.assertRaises(RuntimeError):
+            batches.throw(RuntimeError("caída simulada"))
+        journal.close()
+
+        self.assertEqual(incomplete_runs(self.directory), [journal.run_id])
+        self.assertEqual(recover_runs(self.directory, "finish"), [journal.run_id])
+        self.assertEqual(incomplete_runs(self.directory), [])
+        self.assertTrue(os.path.exists(self.path("b", "three.txt")))
+        self.assertTrue(all(name.endswith(DONE_SUFFIX) for name in self.journal_names()))
+
+    def test_rollback_only_undoes_the_crashed_run(self):
+        with MoveJournal(self.directory) as finished:
+            apply_plan(self.plan_into("a", "one.txt"), journal=finished)
+        journal = MoveJournal(self.directory)
+        batches = iter_apply_plan(self.plan_into("b", "two.txt", "three.txt"), journal=journal,
+                                  batch_size=1)
+        next(batches)
+        with self.assertRaises(RuntimeError):
+            batches.throw(RuntimeError("caída simulada"))
+        journal.close()
+
+        recover_runs(self.directory, "rollback")
+        self.assertTrue(os.path.exists(self.path("two.txt")))
+        self.assertTrue(os.path.exists(self.path("a", "one.txt")))
+        self.assertEqual(incomplete_runs(self.directory), [])
+
+    def test_prune_keeps_the_most_recent_finished_journals(self):
+        runs = []
+        for _ in range(5):
+            with MoveJournal(self.directory) as journal:
+                journal.end()
+            runs.append(journal.run_id)
+        crashed = MoveJournal(self.directory)
+        crashed.close()
+
+        self.assertEqual(prune_journals(self.directory, keep=2), runs[:3])
+        self.assertEqual(self.journal_names(),
+                         sorted([runs[3] + DONE_SUFFIX, runs[4] + DONE_SUFFIX,
+                                 crashed.run_id + ".ndjson"]))
+
+
+if __name__ == "__main__":
+    unittest.main()
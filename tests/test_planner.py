@@ -0,0 +1,51 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from organizer import apply_plan, plan_directory
+
+
+class NewerConflictTest(unittest.TestCase):
+
+    RULES = {"endwith": {".txt": "docs"}, "contains": {}}
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def path(self, *parts):
+        return os.path.join(self.directory, *parts)
+
+    def write(self, *parts, age):
+        os.makedirs(os.path.dirname(self.path(*parts)), exist_ok=True)
+        with open(self.path(*parts), "w") as f:
+            f.write("/".join(parts))
+        mtime = time.time() - age
+        os.utime(self.path(*parts), (mtime, mtime))
+
+    def organize(self):
+        apply_plan(plan_directory(self.directory, self.RULES, conflict="newer"))
+        with open(self.path("docs", "a.txt")) as f:
+            return f.read()
+
+    def test_flattened_file_is_compared_by_its_own_mtime(self):
+        self.write("docs", "a.txt", age=200)
+        self.write("a.txt", age=300)
+        self.write("y", "a.txt", age=100)
+        self.assertEqual(self.organize(), "y/a.txt")
+
+    def test_flattened_file_with_nothing_in_the_root(self):
+        self.write("docs", "a.txt", age=200)
+        self.write("y", "a.txt", age=100)
+        self.assertEqual(self.organize(), "y/a.txt")
+
+    def test_older_file_is_skipped(self):
+        self.write("docs", "a.txt", age=100)
+        self.write("y", "a.txt", age=200)
+        self.assertEqual(self.organize(), "docs/a.txt")
+
+
+if __name__ == "__main__":
+    unittest.main()
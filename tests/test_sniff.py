@@ -0,0 +1,57 @@
+import os
+import shutil
+import tempfile
+import unittest
+import zipfile
+
+from organizer import sniff_extension
+
+
+class SniffTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def write(self, name, content):
+        path = os.path.join(self.directory, name)
+        with open(path, "wb") as f:
+            f.write(content)
+        return path
+
+    def test_iso_bmff_by_major_brand(self):
+        for brand, extension in ((b"isom", ".mp4"), (b"qt  ", ".mov"), (b"heic", ".heic"),
+                                 (b"avif", ".avif"), (b"M4A ", ".m4a"), (b"xxxx", None)):
+            path = self.write("file", b"\x00\x00\x00\x18ftyp" + brand + bytes(20))
+            self.assertEqual(sniff_extension(path), extension, brand)
+
+    def test_office_document_with_folders_past_the_header(self):
+        path = os.path.join(self.directory, "document")
+        with zipfile.ZipFile(path, "w") as z:
+            z.writestr("[Content_Types].xml", "x" * 600)
+            z.writestr("_rels/.rels", "y" * 300)
+            z.writestr("word/document.xml", "z")
+        self.assertIsNone(sniff_extension(path))
+
+    def test_office_document_by_its_first_entry(self):
+        path = os.path.join(self.directory, "sheet")
+        with zipfile.ZipFile(path, "w") as z:
+            z.writestr("xl/workbook.xml", "x")
+        self.assertEqual(sniff_extension(path), ".xlsx")
+
+    def test_zip_with_office_like_folders_further_in(self):
+        for name in ("excel_exports/xl/a.csv", "keyword/notes.txt"):
+            path = os.path.join(self.directory, "archive")
+            with zipfile.ZipFile(path, "w") as z:
+                z.writestr(name, "a,b")
+            self.assertEqual(sniff_extension(path), ".zip", name)
+
+    def test_plain_zip(self):
+        path = os.path.join(self.directory, "archive")
+        with zipfile.ZipFile(path, "w") as z:
+            z.writestr("notes.txt", "hola")
+        self.assertEqual(sniff_extension(path), ".zip")
+
+
+if __name__ == "__main__":
+    unittest.main()